@@ -0,0 +1,278 @@
+/*
+ * Optional speedups for the Creole wiki markup parser.
+ *
+ * This extension provides C implementations of the inline markup scanner
+ * and of the line reader for strings.  The creole_parser module uses them
+ * for its 'c' engine when the extension is built and falls back to its
+ * pure-Python code when it is not.  Build it in the directory containing
+ * creole_parser.py with:
+ *
+ *     cc -shared -fPIC -O2 $(python3-config --includes) _creole_speedups.c \
+ *         -o _creole_speedups$(python3-config --extension-suffix)
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <structmember.h>
+
+/*
+ * Return true if the character can begin inline markup or a fragment
+ * delimiter.  These are the characters of _INLINE_MARKUP_CHARS.
+ */
+static int
+is_markup_char(Py_UCS4 c)
+{
+    switch (c) {
+    case '~': case '*': case '/': case '^': case ',': case '_':
+    case '\\': case '[': case '{': case '|': case ']':
+        return 1;
+    default:
+        return 0;
+    }
+}
+
+/*
+ * Return true if the ASCII prefix occurs in the line at the index.
+ */
+static int
+starts_with(int kind, const void *data, Py_ssize_t length, Py_ssize_t index,
+            const char *prefix)
+{
+    for (; *prefix; prefix++, index++) {
+        if (index >= length ||
+                PyUnicode_READ(kind, data, index) != (Py_UCS4)*prefix) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+/*
+ * Return true if a free link begins in the line at the index.  These are
+ * the prefixes of _FREE_LINKS.
+ */
+static int
+is_free_link(int kind, const void *data, Py_ssize_t length, Py_ssize_t index)
+{
+    Py_UCS4 c = PyUnicode_READ(kind, data, index);
+    if (c == 'h') {
+        return starts_with(kind, data, length, index, "http://") ||
+               starts_with(kind, data, length, index, "https://");
+    }
+    if (c == 'f') {
+        return starts_with(kind, data, length, index, "ftp://");
+    }
+    return 0;
+}
+
+/* InlineScanner */
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *line;
+} InlineScannerObject;
+
+static int
+InlineScanner_init(InlineScannerObject *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *line;
+    if (!PyArg_ParseTuple(args, "U:InlineScanner", &line)) {
+        return -1;
+    }
+#if PY_VERSION_HEX < 0x030C0000
+    if (PyUnicode_READY(line) < 0) {
+        return -1;
+    }
+#endif
+    Py_INCREF(line);
+    Py_XSETREF(self->line, line);
+    return 0;
+}
+
+static void
+InlineScanner_dealloc(InlineScannerObject *self)
+{
+    Py_XDECREF(self->line);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *
+InlineScanner_find(InlineScannerObject *self, PyObject *arg)
+{
+    Py_ssize_t index = PyLong_AsSsize_t(arg);
+    if (index == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (self->line == NULL) {
+        PyErr_SetString(PyExc_ValueError, "scanner has no line");
+        return NULL;
+    }
+    int kind = PyUnicode_KIND(self->line);
+    const void *data = PyUnicode_DATA(self->line);
+    Py_ssize_t length = PyUnicode_GET_LENGTH(self->line);
+    if (index < 0) {
+        index = 0;
+    }
+    for (; index < length; index++) {
+        Py_UCS4 c = PyUnicode_READ(kind, data, index);
+        if (is_markup_char(c) ||
+                ((c == 'h' || c == 'f') &&
+                 is_free_link(kind, data, length, index))) {
+            break;
+        }
+    }
+    if (index > length) {
+        index = length;
+    }
+    return PyLong_FromSsize_t(index);
+}
+
+static PyMethodDef InlineScanner_methods[] = {
+    {"find", (PyCFunction)InlineScanner_find, METH_O,
+     "Return the index of the first candidate at or after the index or the\n"
+     "length of the line if there are no more candidates."},
+    {NULL}
+};
+
+static PyMemberDef InlineScanner_members[] = {
+    {"line", T_OBJECT, offsetof(InlineScannerObject, line), READONLY,
+     "The line being scanned."},
+    {NULL}
+};
+
+static PyTypeObject InlineScannerType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_creole_speedups.InlineScanner",
+    .tp_doc = "Locates the next position in a line at which inline markup\n"
+              "can begin.",
+    .tp_basicsize = sizeof(InlineScannerObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)InlineScanner_init,
+    .tp_dealloc = (destructor)InlineScanner_dealloc,
+    .tp_methods = InlineScanner_methods,
+    .tp_members = InlineScanner_members,
+};
+
+/* LineReader */
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *text;
+    Py_ssize_t index;
+} LineReaderObject;
+
+static int
+LineReader_init(LineReaderObject *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *text;
+    if (!PyArg_ParseTuple(args, "U:LineReader", &text)) {
+        return -1;
+    }
+#if PY_VERSION_HEX < 0x030C0000
+    if (PyUnicode_READY(text) < 0) {
+        return -1;
+    }
+#endif
+    Py_INCREF(text);
+    Py_XSETREF(self->text, text);
+    self->index = 0;
+    return 0;
+}
+
+static void
+LineReader_dealloc(LineReaderObject *self)
+{
+    Py_XDECREF(self->text);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *
+LineReader_iter(PyObject *self)
+{
+    Py_INCREF(self);
+    return self;
+}
+
+/*
+ * Return the next line without its CR, LF, or CRLF terminator or NULL
+ * (without an exception set) at the end of the text.
+ */
+static PyObject *
+LineReader_next(LineReaderObject *self)
+{
+    if (self->text == NULL) {
+        return NULL;
+    }
+    int kind = PyUnicode_KIND(self->text);
+    const void *data = PyUnicode_DATA(self->text);
+    Py_ssize_t length = PyUnicode_GET_LENGTH(self->text);
+    Py_ssize_t begin = self->index;
+    Py_ssize_t end = begin;
+    if (begin >= length) {
+        return NULL;
+    }
+    while (end < length) {
+        Py_UCS4 c = PyUnicode_READ(kind, data, end);
+        if (c == '\n' || c == '\r') {
+            break;
+        }
+        end++;
+    }
+    self->index = end + 1;
+    if (end + 1 < length && PyUnicode_READ(kind, data, end) == '\r' &&
+            PyUnicode_READ(kind, data, end + 1) == '\n') {
+        self->index = end + 2;
+    }
+    return PyUnicode_Substring(self->text, begin, end);
+}
+
+static PyTypeObject LineReaderType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_creole_speedups.LineReader",
+    .tp_doc = "Iterator for reading the lines of a string.",
+    .tp_basicsize = sizeof(LineReaderObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)LineReader_init,
+    .tp_dealloc = (destructor)LineReader_dealloc,
+    .tp_iter = LineReader_iter,
+    .tp_iternext = (iternextfunc)LineReader_next,
+};
+
+/* Module */
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "_creole_speedups",
+    .m_doc = "Optional speedups for the Creole wiki markup parser.",
+    .m_size = -1,
+};
+
+PyMODINIT_FUNC
+PyInit__creole_speedups(void)
+{
+    if (PyType_Ready(&InlineScannerType) < 0 ||
+            PyType_Ready(&LineReaderType) < 0) {
+        return NULL;
+    }
+    PyObject *module = PyModule_Create(&speedups_module);
+    if (module == NULL) {
+        return NULL;
+    }
+    Py_INCREF(&InlineScannerType);
+    if (PyModule_AddObject(module, "InlineScanner",
+                           (PyObject *)&InlineScannerType) < 0) {
+        Py_DECREF(&InlineScannerType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    Py_INCREF(&LineReaderType);
+    if (PyModule_AddObject(module, "LineReader",
+                           (PyObject *)&LineReaderType) < 0) {
+        Py_DECREF(&LineReaderType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
@@ -0,0 +1,968 @@
+"""
+Benchmarks for the Creole wiki markup parser.
+
+Run this module directly to print the timings:
+
+    python benchmark.py
+
+The constructs benchmark parses generated documents that stress one kind of
+markup each (long inline paragraphs, deep lists, wide tables with merged
+columns, many links and images, large preformatted blocks, and heavy
+escaping) plus a mix of all of them, at several sizes.  It reports the
+throughput and the peak memory of each parse.  The results can be saved as
+a JSON baseline and later runs compared with it:
+
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json
+
+The comparison prints every result that is slower or uses more memory than
+the baseline by more than the tolerance (25% by default) and exits with a
+status of 1.  Use --quick for small documents only, --constructs-only to
+skip the other benchmarks, and --write-corpus DIR to save the generated
+documents.
+
+The inline benchmark parses single-line paragraphs of increasing length.
+The time per character should stay roughly constant as the line grows,
+showing that inline scanning takes linear time.
+
+The lines benchmark compares the line reader with the character-by-character
+reader it replaced, for string and bytes input.
+
+The binary benchmark compares storing a parsed document as HTML, as a pickled
+document tree, and in the binary format, by size and by the time taken to
+store it and to render HTML from the stored form.
+
+The writer benchmark compares the HTML writer with the one it replaced,
+which escaped text with three replace() calls and formatted each tag.  It
+reports the time, the number of strings written per kilobyte of output, and
+the peak memory (measured with tracemalloc) per byte of output.
+
+The engines benchmark first checks that every available engine produces
+the same output as the 'python' engine for the test document and the
+generated documents and then compares their speed (in documents per
+second) on the generated documents.  The 'c' engine is included if the
+_creole_speedups extension has been built (see README.md).
+
+The --check option runs correctness checks instead of the benchmarks.
+They check the hits, misses, evictions, and invalidation of a RenderCache,
+that generated heading ids are unique, and that corrupt binary documents
+raise ValueError.  They compare IncrementalParser with CreoleParser over
+random edit sequences, the joined results of the blocks and segments of
+random documents (as used by parse_parallel) with the result of the
+document, the results of one parser shared by a pool of threads with
+serial ones, the results of every available engine for random documents,
+and the line reader and engine of the C extension (if built) with the
+Python ones for random texts with CR, LF, and CRLF line terminators and
+non-ASCII characters.  A check raises AssertionError (or the unexpected
+exception) with the failing input if a result differs.
+
+The adversarial benchmark parses hostile inputs (deeply nested and unclosed
+links, unclosed images, list staircases, and long runs of markup) of
+increasing size with the default limits other than the size limits.  The
+time per character should stay roughly constant.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import random
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from concurrent import futures
+
+import creole_parser
+
+_INLINE_SAMPLE = ('Some //italic// text with a [[link|label]], **bold** '
+                  'and ~escaped ~** markup next to http://example.com/x. ')
+
+_WORDS = ('alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta',
+          'theta', 'iota', 'kappa', 'lambda', 'omicron')
+
+_SIZES = (16 * 1024, 256 * 1024, 1024 * 1024)
+
+_QUICK_SIZES = (16 * 1024, 64 * 1024)
+
+
+def _words(rng, count):
+    """
+    Return a string of count random words.
+    """
+    return ' '.join(rng.choice(_WORDS) for _ in range(count))
+
+
+def _inline_block(rng):
+    """
+    Return a paragraph of a single long line of inline markup.
+    """
+    parts = []
+    for _ in range(rng.randint(50, 150)):
+        parts.append(rng.choice([
+            '**{0}**', '//{0}//', '**//{0}//**', '^^{0}^^', ',,{0},,',
+            '__{0}__', '{0}', '{0}', '{0}', '{0}\\\\{0}',
+        ]).format(_words(rng, 3)))
+    return ' '.join(parts) + '\n\n'
+
+
+def _lists_block(rng):
+    """
+    Return a list that nests to a random depth and back out again.
+    """
+    depth = rng.randint(10, 60)
+    levels = list(range(1, depth + 1)) + list(range(depth - 1, 0, -1))
+    lines = []
+    for level in levels:
+        lines.append('{0} {1}'.format(rng.choice('*#') * level,
+                                      _words(rng, 4)))
+    return '\n'.join(lines) + '\n\n'
+
+
+def _tables_block(rng):
+    """
+    Return a wide table with header cells and merged columns.
+    """
+    columns = rng.randint(20, 40)
+    lines = ['|=' + '|='.join(_words(rng, 1) for _ in range(columns))]
+    for _ in range(rng.randint(5, 20)):
+        cells = []
+        column = 0
+        while column < columns:
+            span = min(rng.choice([1, 1, 1, 2, 3]), columns - column)
+            cells.append('|' * span + rng.choice(['', '=']) + _words(rng, 2))
+            column += span
+        lines.append(''.join(cells) + '|')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _links_block(rng):
+    """
+    Return a paragraph of links, images, and free links.
+    """
+    parts = []
+    for index in range(rng.randint(20, 60)):
+        parts.append(rng.choice([
+            '[[page{0}]]', '[[page{0}|{1}]]', '[[http://example.com/{0}|{1}]]',
+            '{{{{image{0}.png}}}}', '{{{{image{0}.png|{1}}}}}',
+            '[[page{0}|{{{{icon{0}.png}}}}]]', 'http://example.com/{0}/x',
+            'ftp://example.com/{0}']).format(index, _words(rng, 2)))
+    return ' '.join(parts) + '\n\n'
+
+
+def _nowiki_block(rng):
+    """
+    Return a large preformatted block.
+    """
+    lines = ['{{{']
+    for _ in range(rng.randint(50, 200)):
+        lines.append(rng.choice(['  ', '', '    ']) + _words(rng, 6) +
+                     rng.choice(['', ' **not bold**', ' [[no link]]', ' <&>']))
+    lines.append('}}}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _escapes_block(rng):
+    """
+    Return a paragraph with most of its markup escaped.
+    """
+    parts = []
+    for _ in range(rng.randint(50, 150)):
+        parts.append(rng.choice([
+            '~**{0}~**', '~//{0}', '~[[{0}~]]', '~{{{{{0}', '~~{0}',
+            '~http://example.com/{0}', '{0}~', '~\\\\{0}',
+            '{0}']).format(_words(rng, 2)))
+    return ' '.join(parts) + '\n\n'
+
+
+def _mixed_block(rng):
+    """
+    Return a block of any of the other constructs, preceded by a heading.
+    """
+    heading = '=' * rng.randint(1, 6) + ' ' + _words(rng, 3) + '\n\n'
+    return heading + rng.choice(list(_BLOCKS.values()))(rng)
+
+
+_BLOCKS = {
+    'inline': _inline_block,
+    'lists': _lists_block,
+    'tables': _tables_block,
+    'links': _links_block,
+    'nowiki': _nowiki_block,
+    'escapes': _escapes_block,
+}
+
+CONSTRUCTS = tuple(_BLOCKS) + ('mixed',)
+
+
+def generate(construct, size, seed=0):
+    """
+    Return a synthetic document of about size characters that stresses the
+    specified construct.  The same arguments always return the same text.
+    """
+    block = _mixed_block if construct == 'mixed' else _BLOCKS[construct]
+    rng = random.Random('{0}:{1}'.format(construct, seed))
+    blocks = []
+    length = 0
+    while length < size:
+        blocks.append(block(rng))
+        length += len(blocks[-1])
+    return ''.join(blocks)
+
+
+def _time(func, repeat=3):
+    """
+    Return the best time in seconds of calling func repeat times.
+    """
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+class _CharLineReader:
+    """
+    The previous line reader that examines one character at a time.
+    """
+
+    def __init__(self, text):
+        self._text = text
+        self._length = len(text)
+        self._index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._index >= self._length:
+            raise StopIteration
+        text = self._text
+        length = self._length
+        index = self._index
+        begin = index
+        end = index
+        while index < length:
+            c = text[index]
+            if c == '\r':
+                index += 1
+                if index < length:
+                    if text[index] == '\n':
+                        index += 1
+                break
+            elif c == '\n':
+                index += 1
+                break
+            elif c == ' ' or c == '\t':
+                index += 1
+            else:
+                index += 1
+                end = index
+        self._index = index
+        return text[begin:end]
+
+
+def bench_lines(size=4 * 1024 * 1024):
+    """
+    Time splitting a text of the specified size into stripped lines.
+    """
+    with open('test/creole1.0test.txt') as f:
+        text = f.read()
+    text = text * (size // len(text) + 1)
+    data = text.encode('utf-8')
+    print('Line splitting ({0:.1f} MB)'.format(len(text) / 1e6))
+    readers = [
+        ('character loop (str)', lambda: _CharLineReader(text)),
+        ('_LineReader (str)', lambda: creole_parser._LineReader(text)),
+        ('_LineReader (bytes)', lambda: creole_parser._LineReader(data)),
+    ]
+    speedups = creole_parser._creole_speedups
+    if speedups is not None:
+        readers.append(('LineReader (C, str)',
+                        lambda: speedups.LineReader(text)))
+    for name, reader in readers:
+        seconds = _time(lambda: [line.rstrip() for line in reader()])
+        print('{0:>24} {1:>8.4f} s {2:>8.1f} MB/s'.format(
+            name, seconds, len(text) / seconds / 1e6))
+
+
+def bench_inline(sizes=(25000, 50000, 100000, 200000)):
+    """
+    Time the parsing of single-line paragraphs of the specified sizes.
+    """
+    print('Inline scanning (single-line paragraphs)')
+    print('{0:>10} {1:>10} {2:>12}'.format('chars', 'seconds', 'ns/char'))
+    for size in sizes:
+        text = (_INLINE_SAMPLE * (size // len(_INLINE_SAMPLE) + 1))[:size]
+        seconds = _time(lambda: creole_parser.parse(text))
+        print('{0:>10} {1:>10.4f} {2:>12.1f}'.format(
+            size, seconds, seconds * 1e9 / size))
+
+
+class _FormatHTMLWriter(creole_parser._HTMLWriter):
+    """
+    The previous HTML writer that formats each tag and escapes all text.
+    """
+
+    def start(self, tag, attrs):
+        if attrs:
+            a = []
+            for n, v in attrs.items():
+                if v is not None:
+                    a.append(' ')
+                    a.append(n)
+                    a.append('="')
+                    a.append(str(v).replace('"', '&quot;'))
+                    a.append('"')
+            attrs = ''.join(a)
+        else:
+            attrs = ''
+        if tag not in creole_parser._INLINE_TAGS:
+            self._add_newline()
+        if not self._html5 and tag in creole_parser._SELF_CLOSING_TAGS:
+            self._html.append('<{0}{1}/>'.format(tag, attrs))
+        else:
+            self._html.append('<{0}{1}>'.format(tag, attrs))
+        if tag in creole_parser._BLOCK_TAGS:
+            self._add_newline()
+
+    def end(self, tag):
+        html = self._html
+        if tag in creole_parser._CONTENT_TAGS:
+            html[-1] = html[-1].rstrip()
+        elif tag in creole_parser._BLOCK_TAGS:
+            self._add_newline()
+        html.append('</{0}>'.format(tag))
+        if tag not in creole_parser._INLINE_TAGS:
+            self._add_newline()
+
+    def text(self, text):
+        text = text.replace('&', '&amp;')
+        text = text.replace('<', '&lt;')
+        text = text.replace('>', '&gt;')
+        self._html.append(text)
+
+
+def _count_strings(writer_class):
+    """
+    Return a subclass of the writer class counting the strings written.
+    """
+    class CountingWriter(writer_class):
+        strings = 0
+
+        def flush(self):
+            CountingWriter.strings += len(self._html)
+            return writer_class.flush(self)
+
+    return CountingWriter
+
+
+def bench_writer(size=1024 * 1024):
+    """
+    Compare the HTML writers on a generated document of the specified size.
+    """
+    text = generate('mixed', size)
+    parser = creole_parser.CreoleParser()
+    print('HTML writers ({0} characters of markup)'.format(len(text)))
+    print('{0:>16} {1:>10} {2:>12} {3:>12}'.format(
+        'writer', 'seconds', 'strings/KB', 'peak/byte'))
+    for name, writer_class in [('format', _FormatHTMLWriter),
+                               ('_HTMLWriter', creole_parser._HTMLWriter)]:
+        def parse():
+            writer = writer_class(True)
+            return creole_parser._ParseContext(parser, writer).parse(text)
+        seconds = _time(parse)
+        counting_class = _count_strings(writer_class)
+        tracemalloc.start()
+        html = creole_parser._ParseContext(parser, counting_class(True)).parse(
+            text)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('{0:>16} {1:>10.4f} {2:>12.1f} {3:>12.2f}'.format(
+            name, seconds, counting_class.strings * 1024 / len(html),
+            peak / len(html)))
+
+
+def bench_binary(copies=100):
+    """
+    Compare the size and speed of the stored forms of a parsed document.
+    """
+    with open('test/creole1.0test.txt') as f:
+        text = f.read() * copies
+    document = creole_parser.parse_tree(text)
+    formats = [
+        ('HTML', lambda: str(creole_parser.render_html(document)),
+         lambda html: html),
+        ('pickle', lambda: pickle.dumps(document),
+         lambda data: str(creole_parser.render_html(pickle.loads(data)))),
+        ('binary', lambda: creole_parser.dumps(document),
+         lambda data: str(creole_parser.render_html(data))),
+    ]
+    print('Stored documents ({0} characters of markup)'.format(len(text)))
+    print('{0:>10} {1:>10} {2:>10} {3:>10}'.format(
+        'format', 'bytes', 'store', 'render'))
+    for name, store, render in formats:
+        stored = store()
+        size = len(stored.encode('utf-8') if name == 'HTML' else stored)
+        print('{0:>10} {1:>10} {2:>8.4f} s {3:>8.4f} s'.format(
+            name, size, _time(store), _time(lambda: render(stored))))
+
+
+_ADVERSARIAL = [
+    ('nested open links', lambda size: '[[a|' * (size // 4)),
+    ('nested links', lambda size: '[[a|' * (size // 6) + ']]' * (size // 6)),
+    ('open links', lambda size: '[[a' * (size // 3)),
+    ('open images', lambda size: '{{a|' * (size // 4)),
+    ('many links', lambda size: '[[a]] ' * (size // 6)),
+    ('list staircase', lambda size: '\n'.join(
+        '*' * (i % 64 + 1) + ' x' for i in range(size // 36))),
+    ('toggles', lambda size: '**//' * (size // 4)),
+    ('tildes', lambda size: '~' * size),
+    ('pipes', lambda size: '[[' + '|' * size),
+]
+
+
+def bench_adversarial(sizes=(20000, 80000, 320000)):
+    """
+    Time the parsing of hostile inputs of the specified sizes with limits.
+    """
+    limits = creole_parser.Limits(max_input_size=None, max_line_length=None)
+    parser = creole_parser.CreoleParser(limits=limits)
+    print('Adversarial inputs ({0!r})'.format(limits))
+    print('{0:>20} {1:>10} {2:>10} {3:>10}'.format(
+        'input', 'chars', 'seconds', 'ns/char'))
+    for name, generate_input in _ADVERSARIAL:
+        for size in sizes:
+            text = generate_input(size)
+            seconds = _time(lambda: parser.parse(text))
+            print('{0:>20} {1:>10} {2:>10.4f} {3:>10.1f}'.format(
+                name, len(text), seconds, seconds * 1e9 / len(text)))
+
+
+def bench_engines(engines=None, size=256 * 1024):
+    """
+    Compare the output and the speed of the engines for each construct.
+    The default is all of the available engines.  The last column is the
+    speedup of the last engine over the first one.
+    """
+    if engines is None:
+        engines = tuple(creole_parser._ENGINES)
+    parsers = [creole_parser.CreoleParser(engine=engine) for engine in engines]
+    with open('test/creole1.0test.txt') as f:
+        documents = [('test document', f.read())]
+    documents += [(construct, generate(construct, size))
+                  for construct in CONSTRUCTS]
+    for name, text in documents:
+        expected = parsers[0].parse(text)
+        for engine, parser in zip(engines[1:], parsers[1:]):
+            if parser.parse(text) != expected:
+                raise AssertionError('the {0} engine output differs for the '
+                                     '{1}'.format(engine, name))
+    print('Engines ({0} characters of markup, docs/s)'.format(size))
+    print('{0:>16}'.format('construct') +
+          ''.join('{0:>10}'.format(engine) for engine in engines) +
+          '{0:>14}'.format('/'.join([engines[-1], engines[0]])))
+    for name, text in documents[1:]:
+        rates = [1 / _time(lambda: parser.parse(text)) for parser in parsers]
+        print('{0:>16}'.format(name) +
+              ''.join('{0:>10.1f}'.format(rate) for rate in rates) +
+              '{0:>14.2f}'.format(rates[-1] / rates[0]))
+
+
+def bench_links(size=256 * 1024):
+    """
+    Compare extract_links() with a full parse for each construct.  The
+    last column is the speedup of extract_links() over parse().
+    """
+    parser = creole_parser.CreoleParser()
+    print('Links ({0} characters of markup, docs/s)'.format(size))
+    print('{0:>16}{1:>10}{2:>10}{3:>10}{4:>10}'.format(
+        'construct', 'links', 'parse', 'extract', 'speedup'))
+    for construct in CONSTRUCTS:
+        text = generate(construct, size)
+        count = len(parser.extract_links(text))
+        parse_rate = 1 / _time(lambda: parser.parse(text))
+        extract_rate = 1 / _time(lambda: parser.extract_links(text))
+        print('{0:>16}{1:>10}{2:>10.1f}{3:>10.1f}{4:>10.2f}'.format(
+            construct, count, parse_rate, extract_rate,
+            extract_rate / parse_rate))
+
+
+def bench_text(size=2 * 1024 * 1024, max_chars=300):
+    """
+    Compare rendering the whole text of a large generated document with
+    parse_text() and taking a snippet of it.  The snippet should take a
+    time independent of the size of the document.
+    """
+    parser = creole_parser.CreoleParser()
+    print('Text ({0} characters of markup, seconds)'.format(size))
+    print('{0:>16}{1:>12}{2:>12}{3:>12}'.format(
+        'construct', 'render', 'parse_text', 'snippet'))
+    for construct in CONSTRUCTS:
+        text = generate(construct, size)
+        render = _time(lambda: creole_parser.render_text(
+            parser.parse_tree(text)), repeat=1)
+        whole = _time(lambda: parser.parse_text(text), repeat=1)
+        snippet = _time(lambda: parser.parse_text(text, max_chars))
+        print('{0:>16}{1:>12.4f}{2:>12.4f}{3:>12.6f}'.format(
+            construct, render, whole, snippet))
+
+
+def bench_parallel(size=16 * 1024 * 1024, workers=(1, 2, 4, 8)):
+    """
+    Compare parse_parallel() with parse() for a large generated document of
+    each construct and each number of workers.  The columns are speedups
+    over parse() and include starting the worker processes.
+    """
+    parser = creole_parser.CreoleParser()
+    print('Parallel ({0} characters of markup, {1} processors, speedup)'
+          .format(size, os.cpu_count()))
+    print('{0:>16}{1:>10}'.format('construct', 'seconds') +
+          ''.join('{0:>10}'.format(count) for count in workers))
+    for construct in CONSTRUCTS:
+        text = generate(construct, size)
+        expected = parser.parse(text)
+        if parser.parse_parallel(text, workers[-1]) != expected:
+            raise AssertionError('the parallel output differs for the '
+                                 '{0}'.format(construct))
+        seconds = _time(lambda: parser.parse(text), repeat=1)
+        speedups = [seconds / _time(lambda: parser.parse_parallel(text, count),
+                                    repeat=1)
+                    for count in workers]
+        print('{0:>16}{1:>10.3f}'.format(construct, seconds) +
+              ''.join('{0:>10.2f}'.format(speedup) for speedup in speedups))
+
+
+def bench_constructs(constructs=CONSTRUCTS, sizes=_SIZES):
+    """
+    Time the parsing of a generated document of each construct and size and
+    return the results keyed by 'construct/size'.  Each result has the best
+    time in seconds, the throughput in MB/s and documents per second, and
+    the peak memory allocated during the parse in kilobytes.
+    """
+    results = {}
+    print('Constructs')
+    print('{0:>16} {1:>10} {2:>10} {3:>10} {4:>10} {5:>10}'.format(
+        'construct', 'size', 'seconds', 'MB/s', 'docs/s', 'peak KB'))
+    for construct in constructs:
+        for size in sizes:
+            text = generate(construct, size)
+            seconds = _time(lambda: creole_parser.parse(text), repeat=5)
+            tracemalloc.start()
+            creole_parser.parse(text)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result = {
+                'seconds': seconds,
+                'mb_per_s': len(text) / seconds / 1e6,
+                'docs_per_s': 1 / seconds,
+                'peak_kb': peak / 1024,
+            }
+            results['{0}/{1}'.format(construct, size)] = result
+            print('{0:>16} {1:>10} {2:>10.4f} {3:>10.2f} {4:>10.1f} '
+                  '{5:>10.0f}'.format(construct, size, seconds,
+                                      result['mb_per_s'], result['docs_per_s'],
+                                      result['peak_kb']))
+    return results
+
+
+_TOKENS = ('alpha', 'beta', ' ', ' ', '  ', '\t', '=', '==', '*', '**', '#',
+           '//', '[[', ']]', '|', '|=', '{{', '}}', '{{{', '}}}', '~', '\\\\',
+           '----', ',,', '^^', '__', '<&>', '"', 'http://example.com/a',
+           'page', 'img.png', '\u00e9', '\u4e2d')
+
+_LINES = ('', '', '', '{{{', '}}}', '----', '= Heading =', '== Heading',
+          '* item', '** item', '# item', '|a|b|', '|=a|=b|')
+
+
+def _random_line(rng):
+    """
+    Return a random line of markup tokens or a line of block markup.
+    """
+    if rng.random() < 0.3:
+        return rng.choice(_LINES)
+    return ''.join(rng.choice(_TOKENS) for _ in range(rng.randint(0, 12)))
+
+
+def _random_lines(rng, count):
+    """
+    Return a list of count random lines.
+    """
+    return [_random_line(rng) for _ in range(count)]
+
+
+def _resolve(uri):
+    return '/wiki/' + uri
+
+
+def _check_result(result, expected, message):
+    """
+    Raise AssertionError with the message if the result differs from the
+    expected one in its HTML, heading, outline, or dependencies.
+    """
+    if (result != expected or result.heading != expected.heading or
+            result.outline != expected.outline or
+            result.dependencies != expected.dependencies):
+        raise AssertionError(message)
+
+
+def _check_equal(value, expected, message):
+    """
+    Raise AssertionError with the message if the value is not the expected
+    one.
+    """
+    if value != expected:
+        raise AssertionError('{0}: {1!r} != {2!r}'.format(message, value,
+                                                           expected))
+
+
+class _VersionedResolver:
+    """
+    A resolver whose results change with its version attribute.
+    """
+
+    def __init__(self, version):
+        self.version = version
+
+    def __call__(self, uri):
+        return '/v{0}/{1}'.format(self.version, uri)
+
+
+def check_render_cache():
+    """
+    Check the hits, misses, and evictions of a RenderCache, that changing
+    the version of the resolver invalidates its results (also through a
+    ResolverCache and in a cache directory), that results of different
+    resolvers are not shared, and that a directory survives a new cache.
+    """
+    cache = creole_parser.RenderCache(max_entries=2)
+    parser = creole_parser.CreoleParser(cache=cache)
+    for text in ('a', 'b', 'a', 'c', 'b'):
+        parser.parse(text)
+    _check_equal((cache.hits, cache.misses, cache.evictions, len(cache)),
+                 (1, 4, 2, 2), 'hits, misses, evictions, and entries')
+    with tempfile.TemporaryDirectory() as directory:
+        for name, wrap in (('plain', lambda resolver: resolver),
+                           ('wrapped', creole_parser.ResolverCache)):
+            for path in (None, os.path.join(directory, name)):
+                resolver = _VersionedResolver(1)
+                cache = creole_parser.RenderCache(directory=path)
+                parser = creole_parser.CreoleParser(wrap(resolver),
+                                                    cache=cache)
+                parser.parse('[[a]]')
+                _check_equal(parser.parse('[[a]]'),
+                             '<p><a href="/v1/a">/v1/a</a></p>\n',
+                             'cached result')
+                resolver.version = 2
+                _check_equal(parser.parse('[[a]]'),
+                             '<p><a href="/v2/a">/v2/a</a></p>\n',
+                             'result after a version change')
+                _check_equal((cache.hits, cache.misses), (1, 2),
+                             'hits and misses')
+        cache = creole_parser.RenderCache(
+            directory=os.path.join(directory, 'plain'))
+        parser = creole_parser.CreoleParser(_VersionedResolver(2),
+                                            cache=cache)
+        parser.parse('[[a]]')
+        _check_equal((cache.hits, cache.misses), (1, 0),
+                     'hits and misses of a new cache in the directory')
+    cache = creole_parser.RenderCache()
+    results = [creole_parser.CreoleParser(resolver, cache=cache).parse(
+                   '[[a]]')
+               for resolver in (lambda uri: '/x/' + uri,
+                                lambda uri: '/y/' + uri)]
+    _check_equal(results, ['<p><a href="/x/a">/x/a</a></p>\n',
+                           '<p><a href="/y/a">/y/a</a></p>\n'],
+                 'results of different resolvers')
+    print('Render cache: OK')
+
+
+def check_heading_ids(count=500, seed=0):
+    """
+    Check that the heading ids generated with auto_ids are unique, also
+    when explicit ids repeat or match generated ones, for a fixed document
+    and count random documents.
+    """
+    parser = creole_parser.CreoleParser(auto_ids=True)
+    result = parser.parse('= A =\n= A =\n= B = a-2\n= C = x\n= D = x')
+    _check_equal([entry.id for entry in result.outline],
+                 ['a', 'a-2', 'a-2-2', 'x', 'x-2'], 'heading ids')
+    rng = random.Random(seed)
+    for document in range(count):
+        lines = []
+        for _ in range(rng.randint(0, 20)):
+            line = '= {0} ='.format(rng.choice(('A', 'B', 'a 2', 'A-2')))
+            if rng.random() < 0.5:
+                line += ' ' + rng.choice(('a', 'a-2', 'b', 'a-2-2'))
+            lines.append(line)
+        ids = [entry.id for entry in parser.parse(lines).outline]
+        if len(set(ids)) != len(ids):
+            raise AssertionError('the heading ids are not unique: '
+                                 '{0!r}'.format(lines))
+    print('Heading ids: {0} documents OK'.format(count))
+
+
+def check_binary(count=2000, seed=0):
+    """
+    Check that loading and rendering the binary form of the test document
+    with count random corruptions of one to ten bytes either succeeds or
+    raises ValueError.
+    """
+    with open('test/creole1.0test.txt') as f:
+        data = creole_parser.dumps(creole_parser.parse_tree(f.read()))
+    rng = random.Random(seed)
+    for _ in range(count):
+        corrupt = bytearray(data)
+        for _ in range(rng.randint(1, 10)):
+            corrupt[rng.randrange(len(corrupt))] = rng.randrange(256)
+        corrupt = bytes(corrupt)
+        for load in (creole_parser.loads, creole_parser.render_html,
+                     creole_parser.render_text):
+            try:
+                load(corrupt)
+            except ValueError:
+                pass
+    print('Binary: {0} corrupt documents OK'.format(count))
+
+
+def check_incremental(count=200, edits=20, seed=0):
+    """
+    Check that IncrementalParser.parse() returns the same result as
+    CreoleParser.parse() for count random documents, each edited edits
+    times by inserting, deleting, replacing, or splitting a line.
+    """
+    rng = random.Random(seed)
+    parser = creole_parser.CreoleParser(_resolve)
+    for document in range(count):
+        lines = _random_lines(rng, rng.randint(0, 30))
+        incremental = creole_parser.IncrementalParser(parser)
+        for edit in range(edits + 1):
+            text = '\n'.join(lines)
+            _check_result(incremental.parse(text), parser.parse(text),
+                          'the incremental result differs for edit {0} of '
+                          'document {1}: {2!r}'.format(edit, document, text))
+            index = rng.randint(0, len(lines))
+            action = rng.choice(('insert', 'delete', 'replace', 'split'))
+            if action == 'insert' or index == len(lines):
+                lines.insert(index, _random_line(rng))
+            elif action == 'delete':
+                del lines[index]
+            elif action == 'replace':
+                lines[index] = _random_line(rng)
+            else:
+                line = lines[index]
+                split = rng.randint(0, len(line))
+                lines[index:index + 1] = [line[:split], line[split:]]
+    print('Incremental: {0} documents of {1} edits OK'.format(count, edits))
+
+
+def check_segments(count=500, seed=0):
+    """
+    Check that joining the results of parsing the blocks or the segments of
+    a random document (as IncrementalParser and parse_parallel() do) gives
+    the same result as parsing the document as a whole.
+    """
+    rng = random.Random(seed)
+    parser = creole_parser.CreoleParser(_resolve)
+    for document in range(count):
+        lines = _random_lines(rng, rng.randint(0, 60))
+        expected = parser.parse(lines)
+        blocks = creole_parser._split_blocks(lines)
+        _check_result(creole_parser._join_results(
+                          [parser.parse(block) for block in blocks]),
+                      expected, 'the joined blocks differ for document '
+                      '{0}: {1!r}'.format(document, lines))
+        segments = creole_parser._segments(lines, rng.randint(1, 200))
+        _check_result(creole_parser._join_results(
+                          [parser.parse(segment) for segment in segments]),
+                      expected, 'the joined segments differ for document '
+                      '{0}: {1!r}'.format(document, lines))
+    print('Segments: {0} documents OK'.format(count))
+
+
+def check_threads(workers=8, size=64 * 1024, repeat=4):
+    """
+    Check that one CreoleParser with a resolver shared by a pool of threads
+    returns the same results as parsing the generated documents serially.
+    """
+    parser = creole_parser.CreoleParser(_resolve)
+    documents = [generate(construct, size, seed)
+                 for construct in CONSTRUCTS for seed in range(repeat)]
+    expected = [parser.parse(text) for text in documents]
+    with futures.ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(parser.parse, documents * repeat))
+    for index, result in enumerate(results):
+        _check_result(result, expected[index % len(documents)],
+                      'the threaded result differs for document {0}'
+                      .format(index % len(documents)))
+    print('Threads: {0} parses by {1} threads OK'.format(len(results),
+                                                          workers))
+
+
+def check_engines(count=1000, seed=0):
+    """
+    Check that every available engine returns the same result as the
+    'python' engine for count random documents, for HTML5 and XHTML and
+    with and without a resolver.
+    """
+    rng = random.Random(seed)
+    engines = tuple(creole_parser._ENGINES)
+    configs = [(html5, resolver) for html5 in (True, False)
+               for resolver in (None, _resolve)]
+    parsers = [[creole_parser.CreoleParser(resolver, html5, engine=engine)
+                for engine in engines] for html5, resolver in configs]
+    for document in range(count):
+        text = '\n'.join(_random_lines(rng, rng.randint(0, 20)))
+        for (html5, resolver), config in zip(configs, parsers):
+            expected = config[0].parse(text)
+            for engine, parser in zip(engines[1:], config[1:]):
+                _check_result(parser.parse(text), expected,
+                              'the {0} engine result differs (html5={1}, '
+                              'resolver={2}): {3!r}'.format(
+                                  engine, html5, resolver is not None, text))
+    print('Engines: {0} documents OK ({1})'.format(count, ', '.join(engines)))
+
+
+_FUZZ_TOKENS = ('a', 'b', ' ', '\t', '\r', '\n', '\r\n', '\n\r', '\u00e9',
+                '\u4e2d', '\U0001f600', '=', '*', '#', '|', '~', '**', '//',
+                '[[', ']]', '{{', '}}', '{{{', '}}}', '----', '\\\\',
+                'http://a.com/\u00e9')
+
+
+def check_speedups(count=2000, seed=0):
+    """
+    Check that the LineReader of the _creole_speedups extension returns the
+    same lines as _LineReader and that the 'c' engine returns the same
+    result as the 'python' engine for count random texts with CR, LF, and
+    CRLF line terminators and non-ASCII characters.  The check is skipped
+    if the extension has not been built.
+    """
+    speedups = creole_parser._creole_speedups
+    if speedups is None:
+        print('Speedups: skipped (the _creole_speedups extension is not '
+              'built)')
+        return
+    rng = random.Random(seed)
+    parsers = [(creole_parser.CreoleParser(_resolve, html5, engine='python'),
+                creole_parser.CreoleParser(_resolve, html5, engine='c'))
+               for html5 in (True, False)]
+    for document in range(count):
+        text = ''.join(rng.choice(_FUZZ_TOKENS)
+                       for _ in range(rng.randint(0, 40)))
+        if (list(speedups.LineReader(text)) !=
+                list(creole_parser._LineReader(text))):
+            raise AssertionError('the C LineReader lines differ: '
+                                 '{0!r}'.format(text))
+        for expected_parser, parser in parsers:
+            for source in (text, text.encode('utf-8')):
+                _check_result(parser.parse(source),
+                              expected_parser.parse(source),
+                              'the c engine result differs: {0!r}'.format(
+                                  source))
+    print('Speedups: {0} texts OK'.format(count))
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Return a list of messages describing each result that is slower or uses
+    more memory than its baseline by more than the tolerance (a fraction).
+    Results that are not in the baseline are ignored.
+    """
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        for field, name in (('seconds', 'time'), ('peak_kb', 'peak memory')):
+            old = baseline[key][field]
+            new = results[key][field]
+            if new > old * (1 + tolerance):
+                regressions.append('{0}: {1} {2:.4g} -> {3:.4g} ({4:+.0%})'
+                                   .format(key, name, old, new, new / old - 1))
+    return regressions
+
+
+def _write_corpus(directory, sizes):
+    """
+    Write the generated documents to the directory as .txt files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for construct in CONSTRUCTS:
+        for size in sizes:
+            name = '{0}-{1}.txt'.format(construct, size)
+            path = os.path.join(directory, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(generate(construct, size))
+
+
+def main(argv=None):
+    """
+    Run the benchmarks and return the exit status, which is 1 if a result
+    regressed from the baseline.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark creole_parser.')
+    parser.add_argument('--quick', action='store_true',
+                        help='use small documents only')
+    parser.add_argument('--only', nargs='+', choices=CONSTRUCTS,
+                        default=CONSTRUCTS, metavar='CONSTRUCT',
+                        help='benchmark only these constructs')
+    parser.add_argument('--constructs-only', action='store_true',
+                        help='skip the inline, lines, and binary benchmarks')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare the results with this baseline')
+    parser.add_argument('--save-baseline', metavar='FILE',
+                        help='write the results to this baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown as a fraction (default 0.25)')
+    parser.add_argument('--write-corpus', metavar='DIR',
+                        help='write the generated documents and exit')
+    parser.add_argument('--check', action='store_true',
+                        help='run the correctness checks and exit')
+    args = parser.parse_args(argv)
+    sizes = _QUICK_SIZES if args.quick else _SIZES
+    if args.check:
+        check_render_cache()
+        check_heading_ids()
+        check_binary()
+        check_incremental()
+        check_segments()
+        check_threads()
+        check_engines()
+        check_speedups()
+        return 0
+    if args.write_corpus:
+        _write_corpus(args.write_corpus, sizes)
+        return 0
+    if not args.constructs_only:
+        bench_inline()
+        print()
+        bench_lines()
+        print()
+        bench_binary()
+        print()
+        bench_writer()
+        print()
+        bench_engines()
+        print()
+        bench_links()
+        print()
+        bench_text()
+        print()
+        bench_parallel()
+        print()
+        bench_adversarial()
+        print()
+    results = bench_constructs(args.only, sizes)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print()
+        if regressions:
+            print('REGRESSIONS (tolerance {0:.0%})'.format(args.tolerance))
+            for message in regressions:
+                print('  ' + message)
+            return 1
+        print('No regressions (tolerance {0:.0%})'.format(args.tolerance))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,19 +19,20 @@
 # IN THE SOFTWARE.
 
 """
-Python 3.2 Creole wiki markup parser.
+Python 3 Creole wiki markup parser.
 
 This module parses Cerole wiki version 1.0 markup text into HTML5 or XHTML.
 It only outputs HTML tags, not an entire document.  The parser output is
 is intended for inclusion in the <body> or <div> section of a page.
 
-This module requires Python 3 and has only been tested with version 3.2.
+This module requires Python 3.6 or later.
 
 It provides the CreoleParser class that parses markup from a string or any
 object capable of producing lines of text from an iterator (files, etc.).
 
 It also provides the parse() function that instantiates the parser for
-applications where a simple function call is all that is required.
+applications where a simple function call is all that is required, and
+the parse_many() function that parses many documents in worker processes.
 
 By default, the output is HTML5 text.  This means that tags such as <br>,
 <img>, and <hr> are not output as self-closing tags.  The resulting HTML5
@@ -105,10 +106,42 @@ parsed as valid markup because the text still appears, only not as HTML.
 
 The parser processes the wiki markup text in a single-pass without using
 regular expression substitution.  It does not require any other modules.
+The optional 'regex' engine finds the inline markup of a line with a
+compiled regular expression instead of a loop of string searches.
 """
 
+import array
+import collections
+import hashlib
+import itertools
+import mmap
+import os
+import pickle
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent import futures
+
+# The argparse, asyncio, glob, inspect, json, and sqlite3 modules are only
+# imported by the functions using them so that importing this module (e.g.,
+# in each worker process) stays fast.
+
+try:
+    import _creole_speedups     # optional C extension for the 'c' engine
+except ImportError:
+    _creole_speedups = None
+
 __author__ = 'Frank Hellwig <frank@hellwig.org>'
-__all__ = ['CreoleParser', 'ParseResult', 'parse']
+__all__ = ['CreoleParser', 'DependencyGraph', 'Document', 'Element',
+           'IncrementalParser', 'Limits', 'Link', 'OutlineEntry',
+           'ParseResult', 'ParseStats', 'ParseStream', 'RenderCache',
+           'ResolverCache',
+           'parse', 'parse_async', 'parse_file', 'parse_tree', 'iter_parse',
+           'parse_many', 'parse_parallel', 'parse_text', 'extract_links',
+           'render_html', 'render_text', 'dumps', 'loads']
 
 # The following are the HTML tags used in the output text.
 _HTML_BOLD = 'strong'
@@ -137,19 +170,17 @@ _HTML_HEADINGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
 
 # Content tags do not get a newline character after open or before close.
 # They do, however, get one before open and after close.
-_CONTENT_TAGS = [
+_CONTENT_TAGS = frozenset([
     _HTML_PARAGRAPH,
     _HTML_LIST_ITEM,
     _HTML_DEFINITION_LIST_TERM,
     _HTML_DEFINITION_LIST_DESCRIPTION,
     _HTML_TABLE_HEADER,
     _HTML_TABLE_DATA
-]
-
-_CONTENT_TAGS.extend(_HTML_HEADINGS)
+] + _HTML_HEADINGS)
 
 # Inline tags do not get any newline characters before or after open and close.
-_INLINE_TAGS = [
+_INLINE_TAGS = frozenset([
     _HTML_BOLD,
     _HTML_ITALICS,
     _HTML_SUPERSCRIPT,
@@ -159,7 +190,53 @@ _INLINE_TAGS = [
     _HTML_BREAK,
     _HTML_LINK,
     _HTML_IMAGE
-]
+])
+
+# Block tags (all others) get a newline character before and after both open
+# and close.
+_BLOCK_TAGS = frozenset([
+    _HTML_ORDERED_LIST,
+    _HTML_UNORDERED_LIST,
+    _HTML_DEFINITION_LIST,
+    _HTML_TABLE,
+    _HTML_TABLE_ROW,
+    _HTML_PREFORMATTED,
+    _HTML_HORIZONTAL_RULE
+])
+
+_ALL_TAGS = _CONTENT_TAGS | _INLINE_TAGS | _BLOCK_TAGS
+
+# Maps heading tags to their levels.
+_HEADING_LEVELS = {tag: level for level, tag in enumerate(_HTML_HEADINGS, 1)}
+
+_TABLE_CELL_TAGS = frozenset([_HTML_TABLE_HEADER, _HTML_TABLE_DATA])
+
+# The tags of the blocks written on a line of their own as plain text.
+_TEXT_BLOCK_TAGS = (_CONTENT_TAGS - _TABLE_CELL_TAGS) | frozenset([
+    _HTML_TABLE_ROW,
+    _HTML_PREFORMATTED
+])
+
+# The binary format (see dumps) identifies tags by their index in this list.
+# Tags can be added at the end but existing tags must keep their index.
+_BINARY_TAGS = [
+    _HTML_BOLD, _HTML_ITALICS, _HTML_SUPERSCRIPT, _HTML_SUBSCRIPT,
+    _HTML_UNDERLINE, _HTML_CODE, _HTML_BREAK, _HTML_LINK, _HTML_IMAGE,
+    _HTML_PARAGRAPH, _HTML_ORDERED_LIST, _HTML_UNORDERED_LIST,
+    _HTML_LIST_ITEM, _HTML_DEFINITION_LIST, _HTML_DEFINITION_LIST_TERM,
+    _HTML_DEFINITION_LIST_DESCRIPTION, _HTML_TABLE, _HTML_TABLE_ROW,
+    _HTML_TABLE_HEADER, _HTML_TABLE_DATA, _HTML_PREFORMATTED,
+    _HTML_HORIZONTAL_RULE
+] + _HTML_HEADINGS
+
+_BINARY_TAG_CODES = {tag: code for code, tag in enumerate(_BINARY_TAGS)}
+
+_BINARY_MAGIC = b'CRB\x01'
+
+_BINARY_TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+
+# List tags determine the current list level.
+_LIST_TAGS = frozenset([_HTML_ORDERED_LIST, _HTML_UNORDERED_LIST])
 
 # Maps markup characters to inline markup tags.
 _INLINE_MARKUP_MAP = {
@@ -171,15 +248,59 @@ _INLINE_MARKUP_MAP = {
 }
 
 # Self-closing tags are output as <br/> instead of <br> if html5 is False.
-_SELF_CLOSING_TAGS = [
+_SELF_CLOSING_TAGS = frozenset([
     _HTML_BREAK,
     _HTML_IMAGE,
     _HTML_HORIZONTAL_RULE
-]
+])
+
+
+def _tag_strings(html5):
+    """
+    Return the dictionaries of the opening tags without attributes, of the
+    endings of opening tags with attributes, and of the closing tags.  The
+    strings include the newline that follows a tag.
+    """
+    opening = {}
+    endings = {}
+    closing = {}
+    for tag in _BINARY_TAGS:    # all of the tags
+        ending = '/>' if not html5 and tag in _SELF_CLOSING_TAGS else '>'
+        if tag in _BLOCK_TAGS:
+            ending += '\n'
+        opening[tag] = '<' + tag + ending
+        endings[tag] = ending
+        closing[tag] = '</' + tag + ('>' if tag in _INLINE_TAGS else '>\n')
+    return opening, endings, closing
+
+
+_HTML5_TAG_STRINGS = _tag_strings(True)
+
+_XHTML_TAG_STRINGS = _tag_strings(False)
 
 # Each list element is a prefix for a free-standing link.
 _FREE_LINKS = ['http://', 'https://', 'ftp://']
 
+# Characters at which inline markup (or a fragment delimiter) can begin.
+# Free-standing links are located by searching for their '://' separator.
+_INLINE_MARKUP_CHARS = '~*/^,_\\[{|]'
+
+# A source of one of these types is the entire text rather than an iterator
+# of lines.  The bytes-like types are decoded as UTF-8.
+_TEXT_TYPES = (str, bytes, bytearray, memoryview, mmap.mmap)
+
+# The smallest number of characters in a segment parsed by a worker process
+# of parse_parallel().  Smaller segments cost more to send than to parse.
+_MIN_SEGMENT_SIZE = 256 * 1024
+
+# The name of the manifest of a directory converted by main() (see _convert).
+_MANIFEST_NAME = '.creole-manifest.json'
+
+# The number of seconds between writes of the manifest during a conversion
+# and the largest number of files converted by a worker in one task.
+_MANIFEST_INTERVAL = 30
+_MAX_CONVERT_CHUNK = 64
+
 # RFC 3986 characters for detecting absolute URIs.
 _SCHEME_FIRST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
 _SCHEME_CHARS = _SCHEME_FIRST + '0123456789+-.'
@@ -188,13 +309,30 @@ _SCHEME_CHARS = _SCHEME_FIRST + '0123456789+-.'
 def _escape(s):
     """
     Escape HTML characters and return an escaped string.
+
+    Most text has no characters to escape and is returned as it is.
     """
-    s = s.replace('&', '&amp;')
-    s = s.replace('<', '&lt;')
-    s = s.replace('>', '&gt;')
+    if '&' in s or '<' in s or '>' in s:
+        s = s.replace('&', '&amp;')
+        s = s.replace('<', '&lt;')
+        s = s.replace('>', '&gt;')
     return s
 
 
+def _slug(text):
+    """
+    Return the text as a lowercase id made of its letters and digits with
+    each run of other characters replaced by a hyphen.
+    """
+    slug = []
+    for c in text.lower():
+        if c.isalnum():
+            slug.append(c)
+        elif slug and slug[-1] != '-':
+            slug.append('-')
+    return ''.join(slug).strip('-') or 'section'
+
+
 def _is_absolute(uri):
     """
     Determine if the URI is absolute.
@@ -217,28 +355,100 @@ def _is_absolute(uri):
     return uri[i:i + 3] == '://'
 
 
-def _is_free_link(s):
+def _is_free_link(s, index=0):
     """
-    Determine if the specified string is a free-standing link.
+    Determine if a free-standing link begins at the specified index.
     """
     for prefix in _FREE_LINKS:
-        if s.startswith(prefix):
+        if s.startswith(prefix, index):
             return True
     return False
 
 
+class _InlineScanner:
+    """
+    Locates the next position in a line at which inline markup can begin.
+
+    The position of the next occurrence of each markup character is cached
+    and only searched for again once the parser has moved past it.  Because
+    the parser only moves forward through a line, each character is looked
+    at a bounded number of times and scanning a line takes linear time.
+    """
+
+    def __init__(self, line):
+        """
+        Set the line for this scanner.
+        """
+        self.line = line
+        self._length = len(line)
+        self._chars = {c: -1 for c in _INLINE_MARKUP_CHARS}
+        self._free_link = -1
+
+    def find(self, index):
+        """
+        Return the index of the first candidate at or after the specified
+        index or the length of the line if there are no more candidates.
+        """
+        line = self.line
+        length = self._length
+        chars = self._chars
+        result = length
+        for c, pos in chars.items():
+            if pos < index:
+                pos = line.find(c, index)
+                if pos < 0:
+                    pos = length
+                chars[c] = pos
+            if pos < result:
+                result = pos
+        pos = self._free_link
+        if pos < index:
+            pos = self._free_link = self._find_free_link(index)
+        if pos < result:
+            result = pos
+        return result
+
+    def _find_free_link(self, index):
+        line = self.line
+        sep = line.find('://', index)
+        while sep >= 0:
+            for prefix in _FREE_LINKS:
+                begin = sep - len(prefix) + 3
+                if begin >= index and line.startswith(prefix, begin):
+                    return begin
+            sep = line.find('://', sep + 1)
+        return self._length
+
+
 class _LineReader:
     """
     Iterator for reading lines of text.
+
+    The text can be a string or a bytes-like object (bytes, bytearray,
+    memoryview, or mmap).  Lines of a bytes-like object are decoded one at
+    a time as they are read.  The encoding must be ASCII-compatible (e.g.,
+    UTF-8 or Latin-1) so that the line terminators can be found in bytes.
     """
 
-    def __init__(self, text):
+    def __init__(self, text, encoding='utf-8'):
         """
         Set the text for this reader.
         """
+        if isinstance(text, str):
+            self._cr = '\r'
+            self._lf = '\n'
+            self._encoding = None
+        else:
+            if isinstance(text, memoryview):
+                text = _find_buffer(text)
+            self._cr = b'\r'
+            self._lf = b'\n'
+            self._encoding = encoding
         self._text = text
         self._length = len(text)
         self._index = 0
+        self._next_cr = -1
+        self._next_lf = -1
 
     def __iter__(self):
         """
@@ -250,36 +460,142 @@ class _LineReader:
         """
         Return the next line of text or raise StopIteration if at end.
 
-        Lines are delimited by CR, LF, or CRLF line terminators. Trailing
-        whitespace and the line terminators are not included in the return
-        value. Leading whitespace is retained because it is significant in
-        preformatted blocks.
+        Lines are delimited by CR, LF, or CRLF line terminators.  The line
+        terminators are not included in the return value.  Whitespace is
+        retained (the parser strips it) because leading whitespace is
+        significant in preformatted blocks.
+
+        The position of the next CR and LF is searched for with str.find()
+        (or bytes.find()) and kept until the reader moves past it so each
+        character of the text is only looked at once.
         """
-        if self._index >= self._length:
+        index = self._index
+        length = self._length
+        if index >= length:
             raise StopIteration
         text = self._text
-        length = self._length
-        index = self._index
-        begin = index
-        end = index
-        while index < length:
-            c = text[index]
-            if c == '\r':
-                index += 1
-                if index < length:
-                    if text[index] == '\n':
-                        index += 1
-                break
-            elif c == '\n':
-                index += 1
-                break
-            elif c == ' ' or c == '\t':
-                index += 1
-            else:
-                index += 1
-                end = index
-        self._index = index
-        return text[begin:end]
+        cr = self._next_cr
+        if cr < index:
+            cr = text.find(self._cr, index)
+            if cr < 0:
+                cr = length
+            self._next_cr = cr
+        lf = self._next_lf
+        if lf < index:
+            lf = text.find(self._lf, index)
+            if lf < 0:
+                lf = length
+            self._next_lf = lf
+        if lf < cr:
+            end = lf
+            self._index = lf + 1
+        else:
+            end = cr
+            self._index = cr + 2 if lf == cr + 1 else cr + 1
+        if self._encoding is None:
+            return text[index:end]
+        return str(text[index:end], self._encoding)
+
+
+def _find_buffer(view):
+    """
+    Return an object with a find() method having the bytes of the view.
+
+    This is the object underlying the view if the view covers all of it.
+    Otherwise, the bytes of the view are copied.
+    """
+    obj = view.obj
+    if (view.contiguous and hasattr(obj, 'find') and
+            view.nbytes == len(obj)):
+        return obj
+    return view.tobytes()
+
+
+def _lines(source, reader=_LineReader):
+    """
+    Return an iterator of the lines of text from the specified source.
+
+    A string is read by the reader class.  Other text types are always read
+    by a _LineReader.
+    """
+    if isinstance(source, str):
+        return reader(source)
+    if isinstance(source, _TEXT_TYPES):
+        return _LineReader(source)
+    return source
+
+
+class _TagStack:
+    """
+    The stack of open tags.
+
+    Besides the tags themselves, the stack keeps the number of times each
+    tag is open (the counts dictionary) and the number of open list tags
+    (the list_level attribute) so that membership tests and the list level
+    do not require scanning the stack.
+    """
+
+    __slots__ = ('_tags', 'counts', 'list_level')
+
+    def __init__(self):
+        self._tags = []
+        self.counts = dict.fromkeys(_ALL_TAGS, 0)
+        self.list_level = 0
+
+    def __bool__(self):
+        return bool(self._tags)
+
+    def __len__(self):
+        return len(self._tags)
+
+    def __iter__(self):
+        return iter(self._tags)
+
+    def __contains__(self, tag):
+        return self.counts[tag] > 0
+
+    def top(self):
+        """
+        Return the tag at the top of the stack or None if it is empty.
+        """
+        return self._tags[-1] if self._tags else None
+
+    def push(self, tag):
+        self._tags.append(tag)
+        self.counts[tag] += 1
+        if tag in _LIST_TAGS:
+            self.list_level += 1
+
+    def pop(self):
+        tag = self._tags.pop()
+        self.counts[tag] -= 1
+        if tag in _LIST_TAGS:
+            self.list_level -= 1
+        return tag
+
+
+OutlineEntry = collections.namedtuple('OutlineEntry', 'level text id offset')
+OutlineEntry.__doc__ = """
+A heading in the outline of a parsed document.
+
+The level is 1 to 6, the text is the heading text (escaped once, as for the
+heading attribute of a ParseResult), the id is the value of the id attribute
+of the heading tag (or None), and the offset is the index in the HTML text
+of the '<' of the heading tag.
+"""
+
+
+Link = collections.namedtuple('Link', 'kind target label line column')
+Link.__doc__ = """
+A link or image found by extract_links().
+
+The kind is 'link' for [[...]] markup, 'free_link' for a URI in the text,
+or 'image' for {{...}} markup.  The target is the URI as it is passed to
+the resolver (links and images) or as it is written (free links).  The
+label is the text of a link or the alternative text of an image (or None
+if an image has none).  The line is the line number starting at 1 and the
+column is the index in that line of the start of the markup.
+"""
 
 
 class ParseResult(str):
@@ -287,12 +603,507 @@ class ParseResult(str):
     The result of parsing Creole wiki markup.
 
     This class extends the string class and adds the heading attribute.
+    The stats attribute is a ParseStats instance if the parse was profiled
+    and None otherwise.  The limited attribute is True if the parse reached
+    one of its Limits and part of the markup was output as plain text.
+
+    The outline attribute is a list of an OutlineEntry for each heading in
+    the order of the text.  The dependencies attribute is the frozenset of
+    the URIs passed to the resolver, whose results the HTML depends on (see
+    DependencyGraph).
     """
-    def __new__(cls, value, heading):
+
+    stats = None
+    limited = False
+    dependencies = frozenset()
+
+    def __new__(cls, value, heading, outline=None):
         return str.__new__(cls, value)
     
-    def __init__(self, html, heading):
+    def __init__(self, html, heading, outline=None):
         self.heading = heading
+        self.outline = outline if outline is not None else []
+
+    def section(self, index):
+        """
+        Return the HTML text of the section of the outline entry at the
+        specified index: its heading and everything following it up to the
+        next heading of the same or a higher level.
+        """
+        entry = self.outline[index]
+        for following in self.outline[index + 1:]:
+            if following.level <= entry.level:
+                return self[entry.offset:following.offset]
+        return self[entry.offset:]
+
+    def __reduce__(self):
+        return (self.__class__, (str(self), self.heading), self.__dict__)
+
+
+class ParseStats:
+    """
+    The counters and timings of a profiled parse.
+
+    The calls and times dictionaries map the name of each parser handler
+    (heading, list_item, definition_list_item, table_row, content, nowiki,
+    free_link, link, and image) and of the resolver calls (resolve and
+    resolve_many) to the number of calls and to their cumulative time in
+    seconds.  Handlers that were not called are not included.  The time of
+    a handler includes that of the handlers it calls (e.g., the links in a
+    list item), so the times do not add up to the total.
+
+    The seconds attribute is the total time of the parse.  The bytes_in and
+    bytes_out attributes are the sizes of the markup lines and of the HTML
+    text encoded as UTF-8.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.times = {}
+        self.seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __repr__(self):
+        return ('ParseStats(seconds={0:.6f}, bytes_in={1}, bytes_out={2}, '
+                'calls={3!r})'.format(self.seconds, self.bytes_in,
+                                      self.bytes_out, self.calls))
+
+
+class Element:
+    """
+    An element of a parsed document.
+
+    The tag attribute is the HTML tag name, attrs is a dictionary of the
+    attribute values, and children is a list of Element instances and text
+    strings.  The text is not escaped.  Elements for the <br>, <img>, and
+    <hr> tags never have children.
+    """
+
+    __slots__ = ('tag', 'attrs', 'children')
+
+    def __init__(self, tag, attrs=None, children=None):
+        self.tag = tag
+        self.attrs = attrs if attrs is not None else {}
+        self.children = children if children is not None else []
+
+    def __repr__(self):
+        return '{0}({1!r}, {2!r}, {3!r})'.format(
+            type(self).__name__, self.tag, self.attrs, self.children)
+
+
+class Document(Element):
+    """
+    The root of a parsed document.
+
+    A document is an element without a tag.  Its children are the top-level
+    blocks and its heading attribute is the first heading in the text as
+    for a ParseResult (escaped once).  The text of a heading element is not
+    escaped, like all other text.
+    """
+
+    __slots__ = ('heading',)
+
+    def __init__(self, children=None, heading=None):
+        Element.__init__(self, None, None, children)
+        self.heading = heading
+
+    def __repr__(self):
+        return 'Document({0!r}, {1!r})'.format(self.children, self.heading)
+
+
+class ParseStream:
+    """
+    An iterator producing the HTML text of a document in chunks.
+
+    Each chunk holds one or more complete top-level blocks (paragraphs,
+    lists, tables, preformatted text, headings, and horizontal rules).
+    Joining all of the chunks gives the same text as the parse() method.
+
+    The heading attribute has the value of the first heading parsed so far.
+    Once the iterator is exhausted, it is the first heading in the text.
+    The stats attribute is a ParseStats instance if the parse is profiled
+    and the limited attribute is True once the parse has reached a limit.
+    The outline attribute lists the headings produced so far and the
+    dependencies attribute is the frozenset of the URIs resolved so far.
+
+    Only the current blocks are held in memory, except that all of the
+    lines of a source that is not a string or bytes-like object are read
+    first if the resolver has a resolve_many() method (see iter_parse).
+    """
+
+    def __init__(self, context, source):
+        self._context = context
+        self._chunks = context.iter_parse(source)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    @property
+    def heading(self):
+        return self._context._heading
+
+    @property
+    def stats(self):
+        return self._context._stats
+
+    @property
+    def limited(self):
+        return self._context._limited
+
+    @property
+    def outline(self):
+        return self._context._out.outline
+
+    @property
+    def dependencies(self):
+        return frozenset(self._context._dependencies)
+
+
+class RenderCache:
+    """
+    A cache of parse results keyed by a hash of the source text and the
+    parser configuration.
+
+    The most recently used results are kept in memory.  The least recently
+    used results are evicted when there are more than max_entries results
+    or when their total size exceeds max_bytes.  If a directory is given,
+    results are also stored there (one file per result) so that the cache
+    survives a restart.  The directory is not limited in size.
+
+    The hits, misses, and evictions attributes count cache lookups that
+    were found, lookups that were not found, and results evicted from
+    memory.  A cache can be shared by parsers and threads.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024,
+                 directory=None):
+        """
+        Initialize an empty cache with the specified limits and directory.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        # Only the configuration is pickled (e.g., by parse_many()).
+        return (self.max_entries, self.max_bytes, self.directory)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def get(self, key, file_key=None):
+        """
+        Return the result for the key or None if it is not in the cache.
+
+        The file_key is the name of the result in the directory.  It is the
+        key itself by default if the key is a string.  Otherwise the result
+        is only looked up in memory.
+        """
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+        file_key = self._file_key(key, file_key)
+        if file_key is not None:
+            try:
+                with open(os.path.join(self.directory, file_key),
+                          'rb') as file:
+                    result = pickle.load(file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+            else:
+                self._store(key, result)
+                with self._lock:
+                    self.hits += 1
+                return result
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, result, file_key=None):
+        """
+        Add the result to the cache using the specified key (and file_key,
+        as for the get() method).
+        """
+        self._store(key, result)
+        file_key = self._file_key(key, file_key)
+        if file_key is not None:
+            fd, path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(result, file, pickle.HIGHEST_PROTOCOL)
+            os.replace(path, os.path.join(self.directory, file_key))
+
+    def clear(self):
+        """
+        Remove all results from memory (the directory is not changed).
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _file_key(self, key, file_key):
+        if self.directory is None:
+            return None
+        if file_key is None and isinstance(key, str):
+            return key
+        return file_key
+
+    def _store(self, key, result):
+        size = sys.getsizeof(result)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= sys.getsizeof(old)
+            self._entries[key] = result
+            self.nbytes += size
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     self.nbytes > self.max_bytes):
+                key, old = self._entries.popitem(last=False)
+                self.nbytes -= sys.getsizeof(old)
+                self.evictions += 1
+
+
+class ResolverCache:
+    """
+    A memoizing link resolver that can be shared by parsers and threads.
+
+    The resolver is either a function taking a URI and returning a resolved
+    URI or an object with a resolve_many() method taking a list of URIs and
+    returning a dictionary of resolved URIs.  Resolved URIs are kept for ttl
+    seconds (forever if ttl is None).  The least recently used URIs are
+    evicted when there are more than max_entries of them.
+
+    A ResolverCache has a resolve_many() method so a parser using it
+    collects the URIs of a document and resolves those not in the cache
+    with a single call to the resolver.  The hits and misses attributes
+    count the URIs found and not found in the cache.  The cache is cleared
+    when the version attribute of the resolver changes.
+    """
+
+    def __init__(self, resolver, max_entries=10000, ttl=None):
+        """
+        Initialize an empty cache for the resolver.
+        """
+        self.__wrapped__ = resolver
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._version = self.version
+
+    def __getstate__(self):
+        return (self.__wrapped__, self.max_entries, self.ttl)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @property
+    def version(self):
+        """
+        The version attribute of the resolver (None if it does not have one).
+        """
+        return getattr(self.__wrapped__, 'version', None)
+
+    @property
+    def cache_key(self):
+        """
+        The cache_key attribute of the resolver (None if it does not have one).
+        """
+        return getattr(self.__wrapped__, 'cache_key', None)
+
+    def __call__(self, uri):
+        """
+        Return the resolved URI.
+        """
+        return self.resolve_many([uri]).get(uri, uri)
+
+    def resolve_many(self, uris):
+        """
+        Return a dictionary mapping each of the URIs to its resolved URI.
+        """
+        result = {}
+        missing = []
+        now = time.monotonic()
+        version = self.version
+        with self._lock:
+            entries = self._entries
+            if version != self._version:
+                entries.clear()
+                self._version = version
+            for uri in uris:
+                entry = entries.get(uri)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    entries.move_to_end(uri)
+                    result[uri] = entry[0]
+                    self.hits += 1
+                else:
+                    missing.append(uri)
+                    self.misses += 1
+        if missing:
+            resolver = self.__wrapped__
+            if hasattr(resolver, 'resolve_many'):
+                resolved = resolver.resolve_many(missing)
+            else:
+                resolved = {uri: resolver(uri) for uri in missing}
+            expires = None if self.ttl is None else now + self.ttl
+            with self._lock:
+                for uri, value in resolved.items():
+                    entries[uri] = (value, expires)
+                    entries.move_to_end(uri)
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+            result.update(resolved)
+        return result
+
+    def clear(self):
+        """
+        Remove all resolved URIs from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class DependencyGraph:
+    """
+    A store of the URIs that each document of a collection (e.g., the pages
+    of a wiki) depends on, kept in an SQLite database.
+
+    The dependencies of a document are the URIs passed to the resolver when
+    it was parsed (see ParseResult.dependencies).  When the resolution of a
+    URI changes (e.g., a page is created or deleted and links to it are
+    rendered differently), only the documents returned by dependents() need
+    to be parsed again.  A graph can be shared by threads.
+    """
+
+    def __init__(self, path=':memory:'):
+        """
+        Open (or create) the database at the path.  The default is a database
+        in memory that is lost when the graph is closed.
+        """
+        import sqlite3
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS dependencies ('
+                'document TEXT NOT NULL, uri TEXT NOT NULL, '
+                'PRIMARY KEY (document, uri))')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS dependencies_uri '
+                'ON dependencies (uri)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, document, uris):
+        """
+        Replace the dependencies of the document (any string identifying it)
+        with the URIs (e.g., the dependencies attribute of its ParseResult).
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM dependencies WHERE document = ?', (document,))
+            self._connection.executemany(
+                'INSERT INTO dependencies (document, uri) VALUES (?, ?)',
+                [(document, uri) for uri in set(uris)])
+
+    def remove(self, document):
+        """
+        Remove the dependencies of the document (e.g., once it is deleted).
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM dependencies WHERE document = ?', (document,))
+
+    def dependents(self, uri):
+        """
+        Return a sorted list of the documents that depend on the URI.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT document FROM dependencies WHERE uri = ? '
+                'ORDER BY document', (uri,)).fetchall()
+        return [row[0] for row in rows]
+
+    def dependencies(self, document):
+        """
+        Return a sorted list of the URIs that the document depends on.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT uri FROM dependencies WHERE document = ? '
+                'ORDER BY uri', (document,)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+class Limits:
+    """
+    Limits on the resources used to parse untrusted markup.
+
+    Each limit can be set to None to remove it.  The defaults are suitable
+    for the text of a wiki page submitted by a user.  When a limit is reached
+    the parse does not fail.  Instead, the markup concerned is output as
+    plain text and the limited attribute of the result is set:
+
+    - max_input_size: the number of characters that are parsed.  The rest of
+      the text is output unparsed as a preformatted block.
+    - max_line_length: the length of a line that is parsed.  A longer line is
+      output unparsed as a preformatted block of its own.
+    - max_depth: the nesting depth of lists and of links within the text of
+      other links.  A deeper list item is treated as the continuation of the
+      previous item and a deeper link as text.
+    - max_links: the number of links, free links, and images.  Any further
+      links and images are output as text.
+    - max_seconds: the time budget of the parse, checked before each line.
+      The rest of the text is output unparsed as a preformatted block.
+
+    With these limits, the time taken by a parse is at most proportional to
+    the size of the text, the nesting depth, and the time budget.
+    """
+
+    def __init__(self, max_input_size=1000000, max_line_length=20000,
+                 max_depth=16, max_links=1000, max_seconds=1.0):
+        self.max_input_size = max_input_size
+        self.max_line_length = max_line_length
+        self.max_depth = max_depth
+        self.max_links = max_links
+        self.max_seconds = max_seconds
+
+    def __repr__(self):
+        return ('Limits(max_input_size={0!r}, max_line_length={1!r}, '
+                'max_depth={2!r}, max_links={3!r}, max_seconds={4!r})'.format(
+                    self.max_input_size, self.max_line_length, self.max_depth,
+                    self.max_links, self.max_seconds))
 
 
 class CreoleParser:
@@ -302,7 +1113,8 @@ class CreoleParser:
     The markup is parsed by calling the parse() method.
     """
 
-    def __init__(self, resolver=None, html5=True):
+    def __init__(self, resolver=None, html5=True, cache=None, profile=False,
+                 limits=None, engine=None, auto_ids=False):
         """
         Initialize this parser with an optional link resolver and HTML5 flag.
 
@@ -313,11 +1125,63 @@ class CreoleParser:
         are required so that interwiki links are not considered absolute and
         can be interpreted by the resolver.
 
+        The resolver can instead be an object with a resolve_many() method
+        taking a list of URI strings and returning a dictionary mapping each
+        URI to its resolved URI.  All of the distinct URIs of a document are
+        then collected first and resolved with a single call.  URIs missing
+        from the dictionary are not changed.  See also ResolverCache.
+
         If the html5 parameter is set to False, then self-closing tags such
         as <br>, <img>, and <hr> are output as <br/>, <img/>, and <hr/>.
+
+        The cache parameter, if provided, must be a RenderCache instance.
+        The parse() method then returns cached results for sources it has
+        already parsed with the same configuration.  The resolver is part of
+        the configuration.  It is identified by the resolver object, its
+        qualified name (or cache_key attribute), and its version attribute
+        (if it has one).  A resolver whose results change over time should
+        have a version attribute that changes with them.
+
+        The profile parameter turns on the collection of counters and timings
+        for each kind of markup (see ParseStats).  If it is True, every parse
+        is profiled.  If it is a number between 0 and 1, it is the fraction of
+        parses that are profiled, chosen at random.  The stats attribute of
+        the result of a profiled parse is set.  Profiled parses do not use
+        the cache.  Without profiling, the handlers are not instrumented at
+        all and the only cost is one test per parse.
+
+        The limits parameter, if provided, must be a Limits instance.  It
+        should be set for markup from untrusted sources.  Results that have
+        reached a limit are not cached.
+
+        The engine parameter selects how the lines and the inline markup of
+        a line are found.  The 'python' engine uses string searches and the
+        'regex' engine uses a compiled regular expression, which is faster
+        for text with many links or escapes.  The 'c' engine uses the
+        optional _creole_speedups extension and is only available if it has
+        been built.  All engines produce the same output.  The default is
+        the 'c' engine if it is available and the 'python' engine if not.
+
+        If the auto_ids parameter is set to True, then headings without an
+        id are given one made from their text (e.g., "Getting Started"
+        becomes "getting-started").  A number is appended to make the ids
+        of a document unique, including explicit ids that are already used
+        by an earlier heading.
         """
+        if engine is None:
+            engine = _DEFAULT_ENGINE
+        elif engine == 'c' and engine not in _ENGINES:
+            raise ValueError('the c engine requires the _creole_speedups '
+                             'extension')
+        elif engine not in _ENGINES:
+            raise ValueError('unknown engine: {0!r}'.format(engine))
         self._resolver = resolver
         self._html5 = html5
+        self._cache = cache
+        self._profile = profile
+        self._limits = limits
+        self._engine = engine
+        self._auto_ids = auto_ids
 
     def parse(self, source):
         """
@@ -325,50 +1189,1326 @@ class CreoleParser:
 
         The source argument must be either a string or an object supporting
         the iteration protocol where each iteration produces a line of text.
-        Text file objects and sys.stdin are valid sources.
+        Text file objects and sys.stdin are valid sources.  The source can
+        also be a bytes-like object (bytes, bytearray, memoryview, or mmap)
+        containing UTF-8 text.  Its lines are decoded as they are parsed.
 
         Returns a ParseResult instance.  This is a string with an additional
         heading attribute.  The heading attribute has the value of the first
         heading in the text.
+
+        The parser does not keep any state between calls so the same
+        instance can be used by several threads at the same time.
+        """
+        context = self._context()
+        cache = self._cache
+        if cache is None or context._stats is not None:
+            return context.parse(source)
+        source, key, file_key = self._cache_key(source)
+        result = cache.get(key, file_key)
+        if result is None:
+            result = context.parse(source)
+            if not result.limited:
+                cache.put(key, result, file_key)
+        return result
+
+    async def parse_async(self, source, concurrency=16):
+        """
+        Parse Creole wiki markup from the specified source using asyncio.
+
+        The source argument is the same as for the parse() method or an
+        asynchronous iterator producing lines of text (e.g., an aiofiles
+        file object).  The result is the same as that of the parse() method.
+
+        The resolver can be a coroutine function (or any function returning
+        an awaitable).  The distinct URIs of the document are collected
+        first and then resolved concurrently with at most concurrency calls
+        in progress at the same time.  If the resolver has a resolve_many()
+        method, it is called once and its result is awaited if necessary.
+        Raises ValueError if concurrency is less than one.
+        """
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        context = self._context()
+        cache = self._cache
+        if cache is None or context._stats is not None:
+            return await context.parse_async(source, concurrency)
+        if hasattr(source, '__aiter__'):
+            source = [line.rstrip() async for line in source]
+        source, key, file_key = self._cache_key(source)
+        result = cache.get(key, file_key)
+        if result is None:
+            result = await context.parse_async(source, concurrency)
+            if not result.limited:
+                cache.put(key, result, file_key)
+        return result
+
+    def parse_tree(self, source):
+        """
+        Parse Creole wiki markup from the specified source into a Document.
+
+        The source argument is the same as for the parse() method.  The
+        document can be rendered as HTML5 or XHTML text using render_html()
+        and as plain text using render_text() without parsing it again.  It
+        can also be cached or pickled instead of the HTML text.
+        """
+        return self._context(_TreeBuilder()).parse_tree(source)
+
+    def iter_parse(self, source):
+        """
+        Parse Creole wiki markup from the specified source in chunks.
+
+        The source argument is the same as for the parse() method.  Returns
+        a ParseStream instance.  This is an iterator producing the HTML text
+        one or more top-level blocks at a time as soon as they are closed so
+        the output can be written to a file or socket while parsing.  Memory
+        use is bounded by the size of the largest block.  The heading is
+        available from the heading attribute once the stream is exhausted.
+
+        If the resolver has a resolve_many() method, the URIs are collected
+        before the first chunk is produced.  A string or bytes-like source
+        is then read twice, but the lines of any other source (e.g., a file
+        object) are read into a list and held in memory.
+        """
+        return ParseStream(self._context(), source)
+
+    def parse_text(self, source, max_chars=None, max_blocks=None):
+        """
+        Parse Creole wiki markup from the specified source into plain text.
+
+        The source argument is the same as for the parse() method.  Returns
+        the same string as render_text(parse_tree(source)) without building
+        a Document.  Each block (paragraph, heading, list item, table row,
+        and so on) is written on a line of its own.
+
+        The max_chars and max_blocks parameters, if provided, limit the text
+        to that many characters and blocks (e.g., for a snippet of the text).
+        The parse then stops as soon as a limit is reached, without reading
+        the rest of the source, so its cost depends on the size of the text
+        returned rather than on the size of the source.  (A resolver with a
+        resolve_many() method still needs the URIs of the whole source.)
+        Text cut at a limit has no trailing whitespace.
+        """
+        writer = _TextWriter(max_chars, max_blocks)
+        return self._context(writer).parse_text(source, max_chars)
+
+    def extract_links(self, source):
+        """
+        Return the links and images of the Creole wiki markup from the
+        specified source without producing any HTML text.
+
+        The source argument is the same as for the parse() method.  Returns
+        a list of a Link tuple for each link, free link, and image that the
+        parse() method would output, in the order of the text.  The targets
+        are not passed to the resolver and the cache is not used.  This is
+        suited to indexing the links of many documents (e.g., to find
+        backlinks or broken links).  How much faster it is than parsing the
+        source depends on the text: paragraphs and tables without links are
+        skipped (15 to 25 times faster in benchmark.py), a mix of markup is
+        about 3 times faster, and pages dense with links, deep lists, or
+        preformatted text are 1.3 to 1.6 times faster.
+        """
+        return _LinkParseContext(self).extract(source)
+
+    def parse_file(self, path, stream, encoding='utf-8'):
         """
-        self._reset()
+        Parse Creole wiki markup from the file at the specified path and
+        write the HTML text to the stream (any object with a write method).
+
+        The file is memory-mapped.  Lines are decoded from the mapped file
+        as they are parsed and the HTML text is written one or more blocks at
+        a time so neither the markup nor the HTML text of the entire file is
+        held in memory.  The encoding must be ASCII-compatible (e.g., UTF-8).
+        If the resolver has a resolve_many() method, the URIs are collected
+        in a first pass over the mapped file.
+
+        Returns the first heading in the text (or None if there is none).
+        """
+        context = self._context()
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                mapped = b''    # an empty file cannot be mapped
+            else:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if hasattr(context._resolver, 'resolve_many'):
+                    context._resolve_many(_LineReader(mapped, encoding))
+                for chunk in context.iter_parse(_LineReader(mapped, encoding)):
+                    stream.write(chunk)
+            finally:
+                if mapped:
+                    mapped.close()
+        return context._heading
+
+    def parse_many(self, sources, workers=None, chunksize=1):
+        """
+        Parse many documents using a pool of worker processes.
+
+        The sources argument is an iterable of sources as accepted by the
+        parse() method.  Returns an iterator producing a ParseResult for each
+        source in the same order as the sources.  Only a bounded number of
+        documents are handed to the pool ahead of the results consumed by
+        the caller so the sources can be a generator over a large collection.
+
+        The workers parameter is the number of processes (the default is the
+        number of processors) and chunksize is the number of documents sent
+        to a process at one time.  Sources that are not strings are read into
+        a list of lines before they are sent to a process.
+
+        The parser (including its resolver) must be picklable to be sent to
+        the processes.  If it is not, the documents are parsed by a pool of
+        threads in this process instead.
+        """
+        workers = workers or os.cpu_count() or 1
+        try:
+            pickle.dumps(self)
+            executor = futures.ProcessPoolExecutor(workers)
+        except Exception:
+            executor = futures.ThreadPoolExecutor(workers)
+        window = 2 * workers
+        pending = collections.deque()
+        with executor:
+            for chunk in _chunks(sources, chunksize):
+                pending.append(executor.submit(_parse_chunk, self, chunk))
+                if len(pending) >= window:
+                    for result in pending.popleft().result():
+                        yield result
+            while pending:
+                for result in pending.popleft().result():
+                    yield result
+
+    def parse_parallel(self, source, workers=None):
+        """
+        Parse one large document using a pool of worker processes.
+
+        The source argument is the same as for the parse() method and the
+        result is identical to the one returned by parse().  The lines are
+        split into segments at the boundaries of the blocks that the parser
+        handles independently of each other (see _split_blocks).  The
+        segments are parsed in parallel and their results are joined.
+
+        The workers parameter is the number of processes (the default is the
+        number of processors).  A resolver with a resolve_many() method is
+        called once for each segment.
+
+        The document is parsed in this process instead if it is too small to
+        be split, if there is one worker, or if the parser is not picklable.
+        It is also parsed by parse() if the parser has limits, generates
+        heading ids, or is profiled, since these apply to the whole document.
+        """
+        if self._limits is not None or self._auto_ids or self._profile:
+            return self.parse(source)
+        cache = self._cache
+        if cache is not None:
+            source, key, file_key = self._cache_key(source)
+            result = cache.get(key, file_key)
+            if result is not None:
+                return result
+        workers = workers or os.cpu_count() or 1
+        reader = _ENGINES[self._engine]._line_reader
+        lines = [line.rstrip() for line in _lines(source, reader)]
+        size = max(sum(map(len, lines)) // (4 * workers), _MIN_SEGMENT_SIZE)
+        segments = list(_segments(lines, size))
+        try:
+            pickle.dumps(self)
+        except Exception:
+            segments = [lines]
+        if len(segments) < 2 or workers < 2:
+            result = self._context().parse(lines)
+        else:
+            with futures.ProcessPoolExecutor(workers) as executor:
+                chunks = executor.map(_parse_chunk, itertools.repeat(self),
+                                      [[segment] for segment in segments])
+                result = _join_results(
+                    [result for chunk in chunks for result in chunk])
+        if cache is not None:
+            cache.put(key, result, file_key)
+        return result
+
+    def _context(self, output=None):
+        """
+        Return a new parse context, profiled if this parse is sampled.
+        """
+        context = _ENGINES[self._engine](self, output)
+        profile = self._profile
+        if profile and (profile is True or random.random() < profile):
+            context.profile()
+        return context
+
+    def _cache_key(self, source):
+        """
+        Return the source (read into a list if it is an iterator), the cache
+        key for the source using this parser configuration, and the key of
+        the result in the cache directory.
+
+        The keys include the name and the version of the resolver so that
+        changing its version invalidates the results.  Results in memory
+        are also keyed on the identity of the resolver.  They are only
+        stored in the directory if there is no resolver or if the resolver
+        has a version or cache_key attribute identifying its results across
+        processes.  Otherwise the file key is None.
+        """
+        config = repr((self._html5, self._limits, self._auto_ids))
+        digest = hashlib.sha256(config.encode('utf-8'))
         if isinstance(source, str):
-            source = _LineReader(source)
+            digest.update(b's')
+            digest.update(source.encode('utf-8', 'surrogatepass'))
+        elif isinstance(source, _TEXT_TYPES):
+            digest.update(b'b')
+            digest.update(source)
+        else:
+            source = [line.rstrip() for line in source]
+            digest.update(b'l')
+            digest.update('\n'.join(source).encode('utf-8', 'surrogatepass'))
+        key = digest.hexdigest()
+        if self._resolver is None:
+            return source, key, key
+        resolver = getattr(self._resolver, '__wrapped__', self._resolver)
+        version = getattr(resolver, 'version', None)
+        name = getattr(resolver, 'cache_key', None)
+        declared = version is not None or name is not None
+        if name is None:
+            name = '{0}.{1}'.format(
+                getattr(resolver, '__module__', None),
+                getattr(resolver, '__qualname__', type(resolver).__qualname__))
+        digest.update(repr((name, version)).encode('utf-8'))
+        key = digest.hexdigest()
+        file_key = key if declared else None
+        return source, (key, _Identity(self._resolver)), file_key
+
+
+class _Identity:
+    """
+    A dictionary key comparing an object by identity.  The object is kept
+    alive so that its id cannot be reused while the key is in use.
+    """
+
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return isinstance(other, _Identity) and other.obj is self.obj
+
+
+class IncrementalParser:
+    """
+    Parse successive versions of a document, such as the text of a page
+    while it is being edited, reparsing only the blocks that have changed.
+
+    The document is split into blocks that the parser handles independently
+    of each other (see _split_blocks).  The HTML of each block is kept from
+    the previous call to parse() and is reused for blocks whose text has not
+    changed, so the work done for an edit is proportional to the size of the
+    changed blocks rather than to the size of the document.  No diff of the
+    text is computed: each call still splits the whole document into blocks
+    and hashes every block to look up its previous HTML.
+
+    After each call, the reparsed and reused attributes hold the number of
+    blocks that were parsed and the number that were taken from the previous
+    version.
+
+    If the parser has limits or generates heading ids, the document is
+    always parsed as a whole so that the limits apply to (and the ids are
+    unique within) the entire document.
+    """
+
+    def __init__(self, parser=None):
+        """
+        Initialize this parser with the CreoleParser used to parse blocks.
+        """
+        self._parser = parser if parser is not None else CreoleParser()
+        self._blocks = {}
+        self.reparsed = 0
+        self.reused = 0
+
+    def parse(self, source):
+        """
+        Parse the current version of the document and return a ParseResult
+        instance identical to the one returned by CreoleParser.parse().
+        """
+        if self._parser._limits is not None or self._parser._auto_ids:
+            self._blocks = {}
+            self.reparsed = 1
+            self.reused = 0
+            return self._parser.parse(source)
+        source = _lines(source)
+        previous = self._blocks
+        blocks = {}
+        results = []
+        self.reparsed = self.reused = 0
+        for block in _split_blocks(line.rstrip() for line in source):
+            key = tuple(block)
+            result = blocks.get(key)
+            if result is None:
+                result = previous.get(key)
+            if result is None:
+                result = _ENGINES[self._parser._engine](self._parser).parse(
+                    block)
+                self.reparsed += 1
+            else:
+                self.reused += 1
+            blocks[key] = result
+            results.append(result)
+        self._blocks = blocks
+        return _join_results(results)
+
+
+def _split_blocks(lines):
+    """
+    Generate lists of lines that can be parsed independently of each other.
+
+    The parser closes all open tags before a blank line, a heading, a
+    horizontal rule, or the start of a preformatted block.  The lines before
+    these are therefore a complete block.  Blank lines are not included in
+    any block because they do not produce output once all tags are closed.
+    Preformatted blocks are never split.
+    """
+    block = []
+    pre = False
+    for line in lines:
+        if pre:
+            block.append(line)
+            if line == '}}}':
+                pre = False
+            continue
+        stripped = line.strip()
+        if (stripped == '' or stripped == '{{{' or stripped == '----' or
+                stripped.startswith('=')):
+            if block:
+                yield block
+                block = []
+            if stripped == '':
+                continue
+            pre = stripped == '{{{'
+        block.append(line)
+    if block:
+        yield block
+
+
+def _segments(lines, size):
+    """
+    Generate lists of lines of at least size characters (except the last
+    one) made of consecutive blocks (see _split_blocks).  The blocks are
+    separated by a blank line, which closes all tags, so that parsing a
+    segment gives the same result as parsing its blocks one by one.
+    """
+    segment = []
+    length = 0
+    for block in _split_blocks(lines):
+        if segment:
+            segment.append('')
+        segment.extend(block)
+        length += sum(map(len, block))
+        if length >= size:
+            yield segment
+            segment = []
+            length = 0
+    if segment:
+        yield segment
+
+
+def _join_results(results):
+    """
+    Join the results of parsing consecutive blocks into one ParseResult.
+    """
+    heading = None
+    outline = []
+    dependencies = set()
+    offset = 0
+    for result in results:
+        if not heading and result.heading is not None:
+            heading = result.heading
+        for entry in result.outline:
+            outline.append(entry._replace(offset=entry.offset + offset))
+        dependencies.update(result.dependencies)
+        offset += len(result)
+    joined = ParseResult(''.join(results), heading, outline)
+    if dependencies:
+        joined.dependencies = frozenset(dependencies)
+    return joined
+
+
+async def _maybe_await(value):
+    """
+    Return the value or, if it is awaitable, the result of awaiting it.
+    """
+    import inspect
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+def _chunks(sources, chunksize):
+    """
+    Generate lists of at most chunksize picklable sources.
+    """
+    chunk = []
+    for source in sources:
+        if isinstance(source, (memoryview, mmap.mmap)):
+            source = bytes(source)
+        elif not isinstance(source, (str, bytes, bytearray)):
+            source = list(source)
+        chunk.append(source)
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_chunk(parser, sources):
+    """
+    Parse a list of sources in a worker and return a list of results.
+    """
+    return [parser.parse(source) for source in sources]
+
+
+class _HTMLWriter:
+    """
+    Writes the events of a parse as HTML5 or XHTML text.
+
+    Block tags are written on lines of their own and the text of content
+    tags is stripped of trailing whitespace.  The text is kept in a list of
+    strings until it is taken by flush().
+
+    The tags are written using precomputed strings (see _tag_strings) that
+    include the newlines following them, so that most events append a
+    single string that is not created for the event.
+
+    The outline attribute is a list of an OutlineEntry for each heading.
+    The offsets are computed from the lengths of the strings written since
+    the last flush, which are only added up when a heading is written.
+
+    The text of a heading is escaped twice, as it always has been, so that
+    the HTML text of a heading is the heading attribute escaped once.
+    """
+
+    def __init__(self, html5):
+        self._html5 = html5
+        self._html = []
+        if html5:
+            tag_strings = _HTML5_TAG_STRINGS
+        else:
+            tag_strings = _XHTML_TAG_STRINGS
+        self._opening, self._endings, self._closing = tag_strings
+        self.outline = []
+        self._flushed = 0       # the length of the text taken by flush()
+        self._measured = 0      # the number of strings added up so far
+        self._measured_length = 0
+        self._heading = None
+
+    def start(self, tag, attrs):
+        """
+        Write the opening tag with the attributes that are not None.
+        """
+        html = self._html
+        if tag not in _INLINE_TAGS and html and not html[-1].endswith('\n'):
+            html.append('\n')
+        if tag in _HEADING_LEVELS:
+            self._start_heading(tag, attrs)
+        if attrs:
+            attrs = ''.join([
+                ' {0}="{1}"'.format(n, str(v).replace('"', '&quot;'))
+                for n, v in attrs.items() if v is not None])
+        if attrs:
+            html.append('<' + tag + attrs + self._endings[tag])
+        else:
+            html.append(self._opening[tag])
+
+    def end(self, tag):
+        """
+        Write the closing tag.
+        """
+        html = self._html
+        if tag in _CONTENT_TAGS:
+            html[-1] = html[-1].rstrip()    # the same string if not stripped
+            if tag in _HEADING_LEVELS:
+                self._end_heading()
+        elif tag in _BLOCK_TAGS:
+            self._add_newline()
+        html.append(self._closing[tag])
+
+    def text(self, text):
+        """
+        Write the escaped text.
+        """
+        text = _escape(text)
+        if self._heading is not None:
+            self._heading[3].append(text)
+            text = _escape(text)
+        self._html.append(text)
+
+    def flush(self):
+        """
+        Return the text written since the last flush.
+        """
+        if not self._html:
+            return ''
+        chunk = ''.join(self._html)
+        self._html = []
+        self._flushed += len(chunk)
+        self._measured = self._measured_length = 0
+        return chunk
+
+    def save(self):
+        """
+        Start writing to an empty buffer and return the current one.
+        """
+        state = self._html
+        self._html = []
+        return state
+
+    def restore(self, state):
+        """
+        Discard the text written since save() and use the saved buffer.
+        """
+        self._html = state
+
+    def merge(self, state):
+        """
+        Append the text written since save() to the saved buffer and use it.
+        """
+        state.extend(self._html)
+        self._html = state
+
+    def _add_newline(self):
+        if self._html and not self._html[-1].endswith('\n'):
+            self._html.append('\n')
+
+    def _start_heading(self, tag, attrs):
+        """
+        Note the level, id, and offset of a heading whose opening tag is
+        about to be written.  Only the last string written so far can still
+        change (see end) so the others are added up once.
+        """
+        html = self._html
+        count = len(html) - 1
+        if count > self._measured:
+            self._measured_length += sum(
+                map(len, itertools.islice(html, self._measured, count)))
+            self._measured = count
+        offset = self._flushed + self._measured_length
+        if html:
+            offset += len(html[-1])
+        self._heading = (_HEADING_LEVELS[tag], attrs.get('id'), offset, [])
+
+    def _end_heading(self):
+        """
+        Add the heading whose closing tag is about to be written to the
+        outline with its text escaped once.
+        """
+        level, id, offset, text = self._heading
+        self._heading = None
+        text = ''.join(text).rstrip()
+        self.outline.append(OutlineEntry(level, text, id, offset))
+
+
+class _TextLimitReached(Exception):
+    """
+    Raised by a _TextWriter when it has written as much text as requested.
+    """
+
+
+class _TextWriter(_HTMLWriter):
+    """
+    Writes the events of a parse as plain text.
+
+    Each paragraph, heading, list item, table row, and so on is written on
+    a line of its own.  Table cells are separated by tab characters, line
+    breaks are written as newline characters, and images are replaced by
+    their alternative text.
+
+    If max_chars is provided, _TextLimitReached is raised once the text
+    and alternative text written add up to at least that many characters.
+    It is not raised while text is written after save() since that text
+    can still be discarded (see _ParseContext._parse_link_markup).  If
+    max_blocks is provided, it is raised before starting one more block.
+    """
+
+    def __init__(self, max_chars=None, max_blocks=None):
+        _HTMLWriter.__init__(self, True)
+        self._chars = sys.maxsize if max_chars is None else max_chars
+        self._blocks = sys.maxsize if max_blocks is None else max_blocks
+        self._saved = 0     # the number of buffers saved by save()
+
+    def start(self, tag, attrs):
+        if tag == _HTML_BREAK:
+            self._html.append('\n')
+        elif tag == _HTML_IMAGE:
+            if attrs.get('alt'):
+                self._add(attrs['alt'])
+        elif tag not in _INLINE_TAGS and tag not in _TABLE_CELL_TAGS:
+            self._end_line()
+            if tag in _TEXT_BLOCK_TAGS:
+                if self._blocks <= 0:
+                    raise _TextLimitReached()
+                self._blocks -= 1
+
+    def end(self, tag):
+        if tag in _TABLE_CELL_TAGS:
+            self._strip()
+            self._html.append('\t')
+        elif tag not in _INLINE_TAGS:
+            self._end_line()
+
+    def text(self, text):
+        self._add(text)
+
+    def save(self):
+        self._saved += 1
+        return (_HTMLWriter.save(self), self._chars)
+
+    def restore(self, state):
+        self._saved -= 1
+        _HTMLWriter.restore(self, state[0])
+        self._chars = state[1]
+
+    def merge(self, state):
+        self._saved -= 1
+        _HTMLWriter.merge(self, state[0])
+        if self._chars <= 0 and not self._saved:
+            raise _TextLimitReached()
+
+    def _add(self, text):
+        self._html.append(text)
+        self._chars -= len(text)
+        if self._chars <= 0 and not self._saved:
+            raise _TextLimitReached()
+
+    def _strip(self):
+        html = self._html
+        while html and html[-1] == '\t':
+            html.pop()
+        if html:
+            html[-1] = html[-1].rstrip(' \t')
+
+    def _end_line(self):
+        self._strip()
+        self._add_newline()
+
+
+class _TreeBuilder:
+    """
+    Builds a Document from the events of a parse.
+    """
+
+    def __init__(self):
+        self._children = []
+        self._open = [self._children]   # the children of the open elements
+
+    def start(self, tag, attrs):
+        attrs = {n: v for n, v in attrs.items() if v is not None}
+        element = Element(tag, attrs)
+        self._open[-1].append(element)
+        if tag not in _SELF_CLOSING_TAGS:
+            self._open.append(element.children)
+
+    def end(self, tag):
+        self._open.pop()
+
+    def text(self, text):
+        self._open[-1].append(text)
+
+    def flush(self):
+        return ''
+
+    def save(self):
+        state = self._open
+        self._open = [[]]
+        return state
+
+    def restore(self, state):
+        self._open = state
+
+    def merge(self, state):
+        state[-1].extend(self._open[0])
+        state.extend(self._open[1:])
+        self._open = state
+
+    def document(self, heading):
+        """
+        Return the Document with the elements built so far.
+        """
+        return Document(self._children, heading)
+
+
+class _BinaryWriter:
+    """
+    Writes the events of a parse in the binary format (see dumps).
+
+    Strings are interned in a pool and the events are written as a list of
+    unsigned words of the smallest size (one, two, or four bytes) that can
+    hold all of them.  The low two bits of each word are the kind of event and
+    the remaining bits are a string index (text) or a tag code (start and
+    end).  A start word is followed by the number of attributes and by the
+    string indexes of the name and value of each attribute.
+    """
+
+    def __init__(self):
+        self._strings = {}
+        self._words = []
+
+    def start(self, tag, attrs):
+        words = self._words
+        words.append(_BINARY_TAG_CODES[tag] << 2 | 1)
+        attrs = [(n, v) for n, v in attrs.items() if v is not None]
+        words.append(len(attrs))
+        for n, v in attrs:
+            words.append(self._intern(n))
+            words.append(self._intern(str(v)))
+
+    def end(self, tag):
+        self._words.append(_BINARY_TAG_CODES[tag] << 2 | 2)
+
+    def text(self, text):
+        self._words.append(self._intern(text) << 2)
+
+    def flush(self):
+        return ''
+
+    def save(self):
+        state = self._words
+        self._words = []
+        return state
+
+    def restore(self, state):
+        self._words = state
+
+    def merge(self, state):
+        state.extend(self._words)
+        self._words = state
+
+    def getvalue(self, heading):
+        """
+        Return the bytes of the document with the specified heading.
+        """
+        heading = 0 if heading is None else self._intern(heading) + 1
+        strings = [s.encode('utf-8', 'surrogatepass') for s in self._strings]
+        header = _binary_array([len(strings), len(self._words), heading], 'I')
+        lengths = _binary_array([len(s) for s in strings])
+        words = _binary_array(self._words)
+        sizes = bytes([lengths.itemsize, words.itemsize])
+        return b''.join([_BINARY_MAGIC, sizes, header.tobytes(),
+                         lengths.tobytes(), words.tobytes()] + strings)
+
+    def _intern(self, s):
+        index = self._strings.get(s)
+        if index is None:
+            index = self._strings[s] = len(self._strings)
+        return index
+
+
+class _LinkRecorder:
+    """
+    Records the links and images of a parse as Link tuples.
+
+    The markup attribute is the kind, line, and column of the markup being
+    parsed.  It is set by the _LinkParseContext before each link or image.
+    The text written inside links is kept for their labels and all other
+    text is discarded.
+    """
+
+    def __init__(self):
+        self.links = []
+        self.markup = None
+        self._text = []
+        self._open = []     # the index of each open link and of its text
+
+    def start(self, tag, attrs):
+        if tag == _HTML_LINK:
+            kind, line, column = self.markup
+            self._open.append((len(self.links), len(self._text)))
+            self.links.append(Link(kind, attrs['href'], None, line, column))
+        elif tag == _HTML_IMAGE:
+            kind, line, column = self.markup
+            self.links.append(Link(kind, attrs['src'], attrs['alt'], line,
+                                   column))
+
+    def end(self, tag):
+        if tag == _HTML_LINK:
+            index, begin = self._open.pop()
+            kind, target, label, line, column = self.links[index]
+            label = ''.join(self._text[begin:]).strip()
+            self.links[index] = Link(kind, target, label, line, column)
+            if not self._open:
+                self._text = []
+
+    def text(self, text):
+        if self._open:
+            self._text.append(text)
+
+    def flush(self):
+        return ''
+
+    def save(self):
+        return (len(self.links), len(self._text), len(self._open))
+
+    def restore(self, state):
+        count, length, depth = state
+        del self.links[count:]
+        del self._text[length:]
+        del self._open[depth:]
+
+    def merge(self, state):
+        pass
+
+    def add(self, target, label):
+        """
+        Record a link with the target and label whose markup is being
+        parsed, without the events of a link (see _LinkParseContext).
+        """
+        kind, line, column = self.markup
+        self.links.append(Link(kind, target, label, line, column))
+
+
+def _binary_array(values, typecode=None):
+    """
+    Return an array of the unsigned values using the specified typecode or
+    the smallest one that can hold all of them.  The array is little-endian
+    once converted to bytes.
+    """
+    if typecode is None:
+        largest = max(values) if values else 0
+        if largest < 0x100:
+            typecode = 'B'
+        elif largest < 0x10000:
+            typecode = 'H'
+        else:
+            typecode = 'I'
+    result = array.array(typecode, values)
+    if sys.byteorder == 'big':
+        result.byteswap()
+    return result
+
+
+def _read_binary_array(data, offset, itemsize, count):
+    """
+    Return the array of count little-endian items read at the offset.
+    """
+    result = array.array(_BINARY_TYPECODES[itemsize])
+    result.frombytes(data[offset:offset + itemsize * count])
+    if sys.byteorder == 'big':
+        result.byteswap()
+    return result
+
+
+def _read_binary(data):
+    """
+    Return the strings, event words, and heading of a binary document.
+    """
+    data = memoryview(data).cast('B')
+    if len(data) < 18 or data[:4] != _BINARY_MAGIC:
+        raise ValueError('not a binary Creole document')
+    if data[4] not in _BINARY_TYPECODES or data[5] not in _BINARY_TYPECODES:
+        raise ValueError('corrupt binary Creole document')
+    count, size, heading = _read_binary_array(data, 6, 4, 3)
+    offset = 18
+    if len(data) < offset + data[4] * count + data[5] * size:
+        raise ValueError('truncated binary Creole document')
+    lengths = _read_binary_array(data, offset, data[4], count)
+    offset += data[4] * count
+    words = _read_binary_array(data, offset, data[5], size)
+    offset += data[5] * size
+    if len(data) != offset + sum(lengths):
+        raise ValueError('truncated binary Creole document')
+    if heading > count:
+        raise ValueError('corrupt binary Creole document')
+    strings = []
+    for length in lengths:
+        strings.append(str(data[offset:offset + length], 'utf-8',
+                           'surrogatepass'))
+        offset += length
+    return strings, words, strings[heading - 1] if heading else None
+
+
+def _replay_binary(data, output):
+    """
+    Send the events of a binary document to the output and return the
+    heading of the document.  Raises ValueError if an event refers to a
+    string, a tag, or an attribute that is not in the document, if a tag
+    is closed that is not the one open, or if a heading has a child tag.
+    """
+    strings, words, heading = _read_binary(data)
+    tags = _BINARY_TAGS
+    index = 0
+    length = len(words)
+    stack = []
+    try:
+        while index < length:
+            word = words[index]
+            kind = word & 3
+            if kind == 0:
+                output.text(strings[word >> 2])
+                index += 1
+            elif kind == 1:
+                end = index + 2 + 2 * words[index + 1]
+                if end > length:
+                    raise IndexError(end)
+                attrs = {}
+                for i in range(index + 2, end, 2):
+                    attrs[strings[words[i]]] = strings[words[i + 1]]
+                tag = tags[word >> 2]
+                if stack and stack[-1] in _HEADING_LEVELS:
+                    raise IndexError(tag)   # headings only have text
+                if tag not in _SELF_CLOSING_TAGS:
+                    stack.append(tag)
+                output.start(tag, attrs)
+                index = end
+            elif kind == 2:
+                tag = tags[word >> 2]
+                if not stack or stack.pop() != tag:
+                    raise IndexError(tag)
+                output.end(tag)
+                index += 1
+            else:
+                raise IndexError(kind)
+    except IndexError:
+        raise ValueError('corrupt binary Creole document') from None
+    return heading
+
+
+def _replay(element, output):
+    """
+    Send the events for the children of the element to the output.
+    """
+    iterators = [iter(element.children)]
+    tags = []
+    while iterators:
+        for node in iterators[-1]:
+            if isinstance(node, str):
+                output.text(node)
+            else:
+                output.start(node.tag, node.attrs)
+                if node.tag not in _SELF_CLOSING_TAGS:
+                    iterators.append(iter(node.children))
+                    tags.append(node.tag)
+                    break
+        else:
+            iterators.pop()
+            if tags:
+                output.end(tags.pop())
+
+
+_PROFILED_HANDLERS = (
+    '_parse_heading',
+    '_parse_list_item',
+    '_parse_definition_list_item',
+    '_parse_table_row',
+    '_parse_content',
+    '_parse_nowiki',
+    '_parse_free_link',
+    '_parse_link',
+    '_parse_image',
+    '_resolve',
+    '_resolve_many',
+)
+
+
+def _timed(method, stats):
+    """
+    Return a function calling the bound method and adding the call and its
+    time to the stats under the method name without the _parse_ prefix.
+    """
+    name = method.__name__
+    name = name[7:] if name.startswith('_parse_') else name[1:]
+    calls = stats.calls
+    times = stats.times
+    clock = time.perf_counter
+
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            times[name] = times.get(name, 0.0) + clock() - start
+            calls[name] = calls.get(name, 0) + 1
+
+    return timed
+
+
+def _counted(lines, stats):
+    """
+    Generate the lines while adding their UTF-8 sizes to the stats.
+    """
+    for line in lines:
+        stats.bytes_in += len(line.encode('utf-8', 'surrogatepass'))
+        yield line
+
+
+class _ParseContext:
+    """
+    The state of a single parse.
+
+    A CreoleParser only holds its configuration.  It creates a new context
+    for each call to parse() so that one parser can be shared by threads.
+
+    The _line_reader and _scanner_type class attributes are the classes
+    used to split a string into lines and to find the inline markup of a
+    line.  The engines other than 'python' replace them or the methods
+    using them.
+    """
+
+    _line_reader = _LineReader
+    _scanner_type = _InlineScanner
+
+    def __init__(self, parser, output=None):
+        """
+        Initialize an empty parse state using the parser configuration.
+
+        The output receives the parse events.  It is an _HTMLWriter for the
+        HTML5 or XHTML text (the default) or a _TreeBuilder for a Document.
+        """
+        self._parser = parser
+        self._resolver = parser._resolver
+        if output is None:
+            output = _HTMLWriter(parser._html5)
+        self._out = output
+        self._stack = _TagStack()
+        self._heading = None
+        self._tag = None
+        self._scanner = None
+        self._stats = None
+        self._limits = limits = parser._limits
+        self._limited = False
+        self._max_depth = sys.maxsize
+        self._link_budget = sys.maxsize
+        if limits is not None:
+            if limits.max_depth is not None:
+                self._max_depth = limits.max_depth
+            if limits.max_links is not None:
+                self._link_budget = limits.max_links
+        self._link_depth = 0
+        self._ids = set() if parser._auto_ids else None
+        self._dependencies = set()
+
+    def profile(self):
+        """
+        Collect the counters and timings of this parse in a ParseStats.
+
+        The handlers are wrapped by timing functions stored as attributes of
+        this context, where they take precedence over the methods, so parses
+        that are not profiled are not slowed down.
+        """
+        stats = self._stats = ParseStats()
+        for name in _PROFILED_HANDLERS:
+            setattr(self, name, _timed(getattr(self, name), stats))
+
+    def parse(self, source):
+        """
+        Parse the source and return a ParseResult instance.
+        """
+        html = ''.join(self.iter_parse(source))
+        result = ParseResult(html, self._heading, self._out.outline)
+        if self._stats is not None:
+            result.stats = self._stats
+        if self._limited:
+            result.limited = True
+        if self._dependencies:
+            result.dependencies = frozenset(self._dependencies)
+        return result
+
+    def parse_text(self, source, max_chars=None):
+        """
+        Parse the source and return the plain text written by the output (a
+        _TextWriter) until it reaches one of its limits.  Text longer than
+        max_chars is cut.
+        """
+        chunks = []
+        cut = False
+        try:
+            for chunk in self.iter_parse(source):
+                chunks.append(chunk)
+        except _TextLimitReached:
+            chunks.append(self._out.flush())
+            cut = True
+        text = ''.join(chunks)
+        if max_chars is not None and len(text) > max_chars:
+            text = text[:max_chars]
+            cut = True
+        if cut:
+            text = text.rstrip()
+        return text
+
+    def parse_tree(self, source):
+        """
+        Parse the source and return the Document built by the output.
+        """
+        for chunk in self.iter_parse(source):
+            pass
+        return self._out.document(self._heading)
+
+    def iter_parse(self, source):
+        """
+        Parse the source and return an iterator of the HTML text in chunks.
+
+        A chunk is produced whenever all tags have been closed after a line
+        so each chunk holds one or more complete top-level blocks.
+        """
+        if self._stats is not None:
+            return self._iter_profiled(source)
+        return self._iter_parse(source)
+
+    def _iter_profiled(self, source):
+        """
+        Generate the chunks of _iter_parse() while adding the time spent
+        producing them and the sizes of the lines and chunks to the stats.
+        """
+        stats = self._stats
+        clock = time.perf_counter
+        chunks = self._iter_parse(source, stats)
+        while True:
+            start = clock()
+            chunk = next(chunks, None)
+            stats.seconds += clock() - start
+            if chunk is None:
+                return
+            stats.bytes_out += len(chunk.encode('utf-8', 'surrogatepass'))
+            yield chunk
+
+    def _iter_parse(self, source, stats=None):
+        if hasattr(self._resolver, 'resolve_many'):
+            if not isinstance(source, _TEXT_TYPES):
+                # The lines are needed twice.  Text is read again instead so
+                # that its lines are not held in memory.
+                source = list(source)
+            self._resolve_many(source)
+        source = _lines(source, self._line_reader)
+        if stats is not None:
+            source = _counted(source, stats)
+        if self._limits is not None:
+            source = self._within_limits(source)
+        output = self._out
         for line in source:
             self._parse_line(line.rstrip())
+            if not self._stack:
+                chunk = output.flush()
+                if chunk:
+                    yield chunk
         self._close_tag()
-        return ParseResult(''.join(self._html), self._heading)
+        chunk = output.flush()
+        if chunk:
+            yield chunk
 
-    def _reset(self):
-        self._stack = []    # tag stack
-        self._html = []     # output buffer
-        self._heading = None
-        self._tag = None
+    def _within_limits(self, source):
+        """
+        Generate the lines of the source while the input size and the time
+        budget are within the limits.  Lines that are too long (outside of a
+        preformatted block) and the rest of the source once a limit has been
+        reached are output unparsed instead.
+        """
+        limits = self._limits
+        max_size = limits.max_input_size
+        max_length = limits.max_line_length
+        if limits.max_seconds is None:
+            deadline = None
+        else:
+            deadline = time.perf_counter() + limits.max_seconds
+        size = 0
+        source = iter(source)
+        for line in source:
+            size += len(line)
+            if ((max_size is not None and size > max_size) or
+                    (deadline is not None and time.perf_counter() > deadline)):
+                self._add_unparsed(itertools.chain([line], source))
+                return
+            if (max_length is not None and len(line) > max_length and
+                    _HTML_PREFORMATTED not in self._stack):
+                self._add_unparsed([line])
+                continue
+            yield line
+
+    def _add_unparsed(self, lines):
+        """
+        Close all tags and output the lines as a preformatted block.
+        """
+        self._limited = True
+        self._close_tag()
+        self._open_tag(_HTML_PREFORMATTED)
+        for line in lines:
+            self._out.text(line.rstrip())
+            self._out.text('\n')
+        self._close_tag()
+
+    def _resolve_many(self, source):
+        """
+        Resolve all of the URIs in the source (text or an iterable of lines)
+        with one resolve_many() call and replace the resolver of this context
+        by a lookup of the results.
+        """
+        uris = self._collect_uris(source)
+        resolved = self._resolver.resolve_many(uris) if uris else {}
+        self._resolver = lambda uri: resolved.get(uri, uri)
+
+    async def parse_async(self, source, concurrency):
+        """
+        Parse the source after resolving its URIs with at most concurrency
+        resolver calls awaited at the same time.
+        """
+        if hasattr(source, '__aiter__'):
+            lines = [line.rstrip() async for line in source]
+        else:
+            lines = [line.rstrip() for line in _lines(source)]
+        resolver = self._resolver
+        if resolver is not None:
+            uris = self._collect_uris(lines)
+            if not uris:
+                resolved = {}
+            elif hasattr(resolver, 'resolve_many'):
+                resolved = await _maybe_await(resolver.resolve_many(uris))
+            else:
+                import asyncio
+                semaphore = asyncio.Semaphore(concurrency)
+
+                async def resolve(uri):
+                    async with semaphore:
+                        return await _maybe_await(resolver(uri))
+
+                values = await asyncio.gather(*[resolve(uri) for uri in uris])
+                resolved = dict(zip(uris, values))
+            self._resolver = lambda uri: resolved.get(uri, uri)
+        return self.parse(lines)
+
+    def _collect_uris(self, lines):
+        """
+        Return a list of the distinct URIs that the lines (or text) pass to
+        the resolver.
+        """
+        uris = {}   # used as an ordered set
+        for link in _LinkParseContext(self._parser).extract(lines):
+            if link.kind != 'free_link' and not _is_absolute(link.target):
+                uris[link.target] = None
+        return list(uris)
 
     def _save_state(self):
-        result = (self._stack, self._html)
-        self._stack = []
-        self._html = []
+        result = (self._stack, self._out.save())
+        self._stack = _TagStack()
         return result
 
     def _restore_state(self, state):
         self._stack = state[0]
-        self._html = state[1]
+        self._out.restore(state[1])
 
     def _merge_state(self, state):
-        state[0].extend(self._stack)
-        state[1].extend(self._html)
-        self._restore_state(state)
+        for tag in self._stack:
+            state[0].push(tag)
+        self._stack = state[0]
+        self._out.merge(state[1])
 
     def _parse_line(self, line):
+        self._scanner = None
         if _HTML_PREFORMATTED in self._stack:
             if line == '}}}':
                 self._close_tag(_HTML_PREFORMATTED)
             else:
                 if line.strip() == '}}}':
                     line = line[1:]
-                self._html.append(_escape(line))
-                self._html.append('\n')
+                self._out.text(line)
+                self._out.text('\n')
             return
         line = line.strip()
         if line == '':
@@ -397,7 +2537,7 @@ class CreoleParser:
                 _HTML_UNORDERED_LIST in self._stack or
                 _HTML_DEFINITION_LIST in self._stack):
             if self._tag != _HTML_BREAK:
-                self._html.append(' ')
+                self._out.text(' ')
             self._tag = None
         else:
             self._close_tag()
@@ -426,7 +2566,8 @@ class CreoleParser:
             else:
                 index += 1
         heading.append(line[begin:index])
-        heading = _escape(''.join(heading).strip())
+        text = ''.join(heading).strip()
+        heading = _escape(text)
         if not self._heading:
             self._heading = heading
         id = None
@@ -435,11 +2576,28 @@ class CreoleParser:
         id = line[index:].lstrip()
         if not id:
             id = None
+        if self._ids is not None:
+            id = self._unique_id(id, text)
         tag = _HTML_HEADINGS[level - 1]
         self._open_tag(tag, id=id)
-        self._html.append(_escape(heading))
+        self._out.text(text)
         self._close_tag(tag)
 
+    def _unique_id(self, id, text):
+        """
+        Return the id of a heading, made from its text if it has none and
+        made unique by appending a number if it is already used.
+        """
+        if id is None:
+            id = _slug(text)
+        base = id
+        number = 1
+        while id in self._ids:
+            number += 1
+            id = '{0}-{1}'.format(base, number)
+        self._ids.add(id)
+        return id
+
     def _parse_list_item(self, line):
         char = line[0]
         index = 0
@@ -448,11 +2606,15 @@ class CreoleParser:
         while index < length and line[index] == char:
             index += 1
             level += 1
-        current_level = self._list_level()
+        current_level = self._stack.list_level
         delta = level - current_level
         if delta > 1:  # not allowed to skip increasing levels
             self._parse_content(line)   # treat the error as content
             return                      # this also deconflicts initial bold
+        if level > self._max_depth:
+            self._limited = True
+            self._parse_content(line)
+            return
         if current_level == 0:
             self._close_tag()
         if delta < 0:
@@ -464,20 +2626,20 @@ class CreoleParser:
         else:
             self._close_tag(_HTML_LIST_ITEM)
         self._open_tag(_HTML_LIST_ITEM)
-        self._parse_fragment(line[index:])
+        self._parse_fragment(line, index)
         
     def _parse_definition_list_item(self, line):
         if _HTML_DEFINITION_LIST not in self._stack:
             self._close_tag()
             self._open_tag(_HTML_DEFINITION_LIST)
-        if self._stack[-1] != _HTML_DEFINITION_LIST:
+        if self._stack.top() != _HTML_DEFINITION_LIST:
             self._close_tag([_HTML_DEFINITION_LIST_TERM,
                 _HTML_DEFINITION_LIST_DESCRIPTION])
         if line[0] == ';':
             self._open_tag(_HTML_DEFINITION_LIST_TERM)
         else:
             self._open_tag(_HTML_DEFINITION_LIST_DESCRIPTION)
-        self._parse_fragment(line[1:])
+        self._parse_fragment(line, 1)
 
     def _parse_table_row(self, line):
         length = len(line)
@@ -507,15 +2669,15 @@ class CreoleParser:
     def _parse_nowiki(self, line, index):
         length = len(line)
         begin = index
-        while index < length:
-            if (line[index:index + 3] == '}}}' and
-                    (index == length - 3 or line[index + 3] != '}')):
-                self._add_text(line, begin, index)
-                self._close_tag(_HTML_CODE)
-                index += 3
-                begin = index
-                break
-            index += 1
+        end = line.find('}}}', index)
+        while end >= 0 and end + 3 < length and line[end + 3] == '}':
+            end = line.find('}}}', end + 1)
+        if end < 0:
+            index = length
+        else:
+            self._add_text(line, begin, end)
+            self._close_tag(_HTML_CODE)
+            index = begin = end + 3
         self._add_text(line, begin, index)
         return index
 
@@ -527,28 +2689,41 @@ class CreoleParser:
         if line[index - 1] in ',.?!:;"\'':
             index -= 1
         href = line[begin:index]
+        if self._link_limit_reached():
+            self._add_text(line, begin, index)
+            return index
         self._open_tag(_HTML_LINK, href=href)
-        self._html.append(_escape(href))
+        self._out.text(href)
         self._close_tag(_HTML_LINK)
         return index
 
     def _parse_link(self, line, index):
+        if self._link_limit_reached(nested=True):
+            self._add_text(line, index - 2, index)
+            return index
+        self._link_depth += 1
+        index = self._parse_link_markup(line, index)
+        self._link_depth -= 1
+        return index
+
+    def _parse_link_markup(self, line, index):
         length = len(line)
         begin = index
         href = None
         state = self._save_state()
-        while index < length and line[index:index + 2] != ']]':
-            if line[index] == '|':
-                href = self._resolve(line[begin:index].strip())
-                self._open_tag(_HTML_LINK, href=href)
-                index = self._parse_fragment(line, index + 1, delim=']]')
-                self._close_tag(_HTML_LINK)
-                break
-            index += 1
-        if not self._html:  # no pipe was found
+        index = line.find(']]', begin)
+        if index < 0:
+            index = length
+        pipe = line.find('|', begin, index)
+        if pipe >= 0:
+            href = self._resolve(line[begin:pipe].strip())
+            self._open_tag(_HTML_LINK, href=href)
+            index = self._parse_fragment(line, pipe + 1, delim=']]')
+            self._close_tag(_HTML_LINK)
+        else:
             href = self._resolve(line[begin:index])
             self._open_tag(_HTML_LINK, href=href)
-            self._html.append(_escape(href))
+            self._out.text(href)
             self._close_tag(_HTML_LINK)
         # Check that the link was closed properly.
         if index < length:
@@ -560,15 +2735,20 @@ class CreoleParser:
             return index
 
     def _parse_image(self, line, index):
+        if self._link_limit_reached():
+            self._add_text(line, index - 2, index)
+            return index
         length = len(line)
         begin = saved_index = index
         src = None
         alt = None
-        while index < length and line[index:index + 2] != '}}':
-            if line[index] == '|' and src is None:
-                src = line[begin:index]
-                begin = index + 1
-            index += 1
+        index = line.find('}}', begin)
+        if index < 0:
+            index = length
+        pipe = line.find('|', begin, index)
+        if pipe >= 0:
+            src = line[begin:pipe]
+            begin = pipe + 1
         # Check that the image was closed properly.
         if index < length:
             if src is None:
@@ -582,6 +2762,18 @@ class CreoleParser:
             self._add_text(line, saved_index - 2, index)
             return index
 
+    def _link_limit_reached(self, nested=False):
+        """
+        Return True if no more links (or nested links) can be parsed and
+        otherwise count the link.
+        """
+        if self._link_budget <= 0 or (nested and
+                                    self._link_depth >= self._max_depth):
+            self._limited = True
+            return True
+        self._link_budget -= 1
+        return False
+
     def _parse_fragment(self, line, index=0, delim=''):
         """
         Parse a fragment of the line starting at the specified index.
@@ -591,49 +2783,50 @@ class CreoleParser:
         of the first character in the delimiter.
         """
         length = len(line)
-        delim_length = len(delim)
-        escape = False
+        scanner = self._scanner
+        if scanner is None or scanner.line is not line:
+            scanner = self._scanner = self._scanner_type(line)
+        counts = self._stack.counts     # the same stack for the whole loop
         begin = index
         while index < length:
-            if _HTML_CODE in self._stack:
+            if counts[_HTML_CODE]:
                 index = self._parse_nowiki(line, index)
                 begin = index
                 continue
-            if escape:
-                escape = False
-                index += 1
-                continue
+            index = scanner.find(index)
+            if index >= length:
+                break
             if line[index] == '~':
                 if index + 1 < length and line[index + 1] not in ' \t':
                     self._add_text(line, begin, index)
-                    escape = True
                     begin = index + 1
-                index += 1
+                    index += 2  # skip the escaped character
+                else:
+                    index += 1
                 continue
-            if delim_length and line[index:index + delim_length] == delim:
+            if delim and line.startswith(delim, index):
                 self._add_text(line, begin, index)
                 begin = index
                 break
-            if line[index:index + 3] == '{{{':
+            if line.startswith('{{{', index):
                 self._add_text(line, begin, index)
                 self._open_tag(_HTML_CODE)
                 index += 3
                 begin = index
                 continue
-            if _is_free_link(line[index:]):
+            if _is_free_link(line, index):
                 self._add_text(line, begin, index)
                 index = self._parse_free_link(line, index)
                 begin = index
                 continue
-            top = self._stack[-1] if self._stack else None
             next_two = line[index:index + 2]
             tag = _INLINE_MARKUP_MAP.get(next_two)
             if tag is not None:
-                if top == tag:
+                if self._stack.top() == tag:
                     self._add_text(line, begin, index)
                     self._close_tag(tag)
                     begin = index + 2
-                elif tag not in self._stack:
+                elif not counts[tag]:
                     self._add_text(line, begin, index)
                     self._open_tag(tag)
                     begin = index + 2
@@ -658,44 +2851,19 @@ class CreoleParser:
 
     def _open_tag(self, tag, **attrs):
         self._add_tag(tag, **attrs)
-        self._stack.append(tag)
+        self._stack.push(tag)
 
     def _close_tag(self, until=None, count=1):
         if not isinstance(until, list):
             until = [until]
         while self._stack and count > 0:
             tag = self._stack.pop()
-            if tag in _CONTENT_TAGS:
-                self._html[-1] = self._html[-1].rstrip()
-            if tag not in _CONTENT_TAGS and tag not in _INLINE_TAGS:
-                self._add_newline()
-            self._html.append('</{0}>'.format(tag))
-            if tag not in _INLINE_TAGS:
-                self._add_newline()
+            self._out.end(tag)
             if tag in until:
                 count -= 1
 
     def _add_tag(self, tag, **attrs):
-        if attrs:
-            a = []
-            for n, v in attrs.items():
-                if v is not None:
-                    a.append(' ')
-                    a.append(n)
-                    a.append('="')
-                    a.append(str(v).replace('"', '&quot;'))
-                    a.append('"')
-            attrs = ''.join(a)
-        else:
-            attrs = ''
-        if tag not in _INLINE_TAGS:
-            self._add_newline()
-        if not self._html5 and tag in _SELF_CLOSING_TAGS:
-            self._html.append('<{0}{1}/>'.format(tag, attrs))
-        else:
-            self._html.append('<{0}{1}>'.format(tag, attrs))
-        if tag not in _CONTENT_TAGS and tag not in _INLINE_TAGS:
-            self._add_newline()
+        self._out.start(tag, attrs)
         self._tag = tag
 
     def _add_text(self, text, begin, end):
@@ -704,25 +2872,318 @@ class CreoleParser:
             if self._tag in _CONTENT_TAGS:
                 text = text.lstrip()
             self._tag = None
-            self._html.append(_escape(text))
-
-    def _add_newline(self):
-        if self._html and self._html[-1] != '\n':
-            self._html.append('\n')
+            self._out.text(text)
 
     def _resolve(self, uri):
         if self._resolver is None:
             return uri
         if _is_absolute(uri):
             return uri
+        self._dependencies.add(uri)
         return self._resolver(uri)
 
-    def _list_level(self):
-        level = 0
-        for tag in self._stack:
-            if tag == _HTML_ORDERED_LIST or tag == _HTML_UNORDERED_LIST:
-                level += 1
-        return level
+
+def _regex_tokens(delim, styles=True):
+    """
+    Return the compiled pattern matching the inline markup of a fragment
+    with the specified delimiter.  The name of the group that matched is
+    the kind of markup.  The alternatives are in the order in which the
+    _ParseContext._parse_fragment() method tests for them, so that the
+    same markup is found at each position.  If styles is False, the markup
+    of text styles and line breaks is left out.
+    """
+    tokens = [r'(?P<escape>~(?=[^ \t]))']
+    if delim:
+        tokens.append('(?P<delim>{0})'.format(re.escape(delim)))
+    tokens += [
+        r'(?P<nowiki>\{\{\{)',
+        r'(?P<free_link>{0})'.format('|'.join(map(re.escape, _FREE_LINKS))),
+    ]
+    if styles:
+        tokens += [
+            r'(?P<tag>{0})'.format('|'.join(map(re.escape,
+                                                _INLINE_MARKUP_MAP))),
+            r'(?P<break>\\\\)',
+        ]
+    tokens += [
+        r'(?P<link>\[\[)',
+        r'(?P<image>\{\{)',
+    ]
+    return re.compile('|'.join(tokens))
+
+
+# The inline markup patterns of the regex engine by fragment delimiter.
+_REGEX_TOKENS = {delim: _regex_tokens(delim) for delim in ('', '|', ']]')}
+
+# The patterns of the link extraction (see _LinkParseContext).  Only link
+# labels are parsed with the markup of text styles and line breaks.
+_LINK_TOKENS = {
+    '': _regex_tokens('', False),
+    '|': _regex_tokens('|', False),
+    ']]': _REGEX_TOKENS[']]'],
+}
+
+
+class _RegexParseContext(_ParseContext):
+    """
+    The state of a single parse using the regex engine.
+
+    The inline markup of a fragment is found with a compiled pattern that
+    matches all of the kinds of markup at once, so the characters between
+    them are skipped by the regular expression engine.  Everything else,
+    including the tag stack, is handled as by the default engine and the
+    output is identical.
+    """
+
+    def _parse_fragment(self, line, index=0, delim=''):
+        length = len(line)
+        search = _REGEX_TOKENS[delim].search
+        counts = self._stack.counts     # the same stack for the whole loop
+        begin = index
+        while index < length:
+            if counts[_HTML_CODE]:
+                index = self._parse_nowiki(line, index)
+                begin = index
+                continue
+            match = search(line, index)
+            if match is None:
+                index = length
+                break
+            index = match.start()
+            kind = match.lastgroup
+            if kind == 'tag':
+                tag = _INLINE_MARKUP_MAP[match.group()]
+                if self._stack.top() == tag:
+                    self._add_text(line, begin, index)
+                    self._close_tag(tag)
+                    begin = index + 2
+                elif not counts[tag]:
+                    self._add_text(line, begin, index)
+                    self._open_tag(tag)
+                    begin = index + 2
+                index += 2
+            elif kind == 'delim':
+                self._add_text(line, begin, index)
+                begin = index
+                break
+            elif kind == 'link':
+                self._add_text(line, begin, index)
+                index = self._parse_link(line, index + 2)
+                begin = index
+            elif kind == 'escape':
+                self._add_text(line, begin, index)
+                begin = index + 1
+                index += 2  # skip the escaped character
+            elif kind == 'free_link':
+                self._add_text(line, begin, index)
+                index = self._parse_free_link(line, index)
+                begin = index
+            elif kind == 'break':
+                self._add_text(line, begin, index)
+                self._add_tag(_HTML_BREAK)
+                index += 2
+                begin = index
+            elif kind == 'image':
+                self._add_text(line, begin, index)
+                index = self._parse_image(line, index + 2)
+                begin = index
+            else:
+                self._add_text(line, begin, index)
+                self._open_tag(_HTML_CODE)
+                index += 3
+                begin = index
+        self._add_text(line, begin, index)
+        return index
+
+
+class _CParseContext(_ParseContext):
+    """
+    The state of a single parse using the c engine.
+
+    The lines of a string and the inline markup of a line are found by the
+    LineReader and InlineScanner types of the _creole_speedups extension,
+    which implement the same interface as _LineReader and _InlineScanner.
+    """
+
+    if _creole_speedups is not None:
+        _line_reader = _creole_speedups.LineReader
+        _scanner_type = _creole_speedups.InlineScanner
+
+
+# The parse context class of each engine.
+_ENGINES = {
+    'python': _ParseContext,
+    'regex': _RegexParseContext,
+}
+
+if _creole_speedups is not None:
+    _ENGINES['c'] = _CParseContext
+
+# The engine used if none is specified: the fastest one available.
+_DEFAULT_ENGINE = 'c' if 'c' in _ENGINES else 'python'
+
+
+class _LinkParseContext(_ParseContext):
+    """
+    The state of a parse extracting the links and images of the text.
+
+    The output is a _LinkRecorder so no HTML text is written, and the
+    resolver is not called.  The inline markup is found as by the regex
+    engine except that the markup of text styles and line breaks is only
+    looked for in link labels, where it changes the text.  It cannot
+    overlap the markup of links, images, escapes, and nowiki text, so the
+    same links are found without it elsewhere.
+
+    A line without "[[", "{{", or "://" cannot contain a link or image.
+    Outside of preformatted blocks and nowiki text, such a line is parsed
+    without its inline markup, which only keeps track of the lists,
+    tables, and paragraphs that it opens and closes.
+
+    Free links and links whose label has no markup are recorded directly
+    instead of through the events of a link and the saved parse state
+    needed to undo a link that is not closed.  This is not done inside the
+    label of another link, whose label includes their text.
+    """
+
+    if _creole_speedups is not None:
+        _line_reader = _creole_speedups.LineReader
+
+    def __init__(self, parser):
+        _ParseContext.__init__(self, parser, _LinkRecorder())
+        self._resolver = None
+        self._ids = None
+        self._line_number = 0
+        self._offset = 0    # the number of leading spaces of the line
+        self._skip = False
+
+    def extract(self, source):
+        """
+        Parse the source and return a list of its Link tuples in the order
+        of the text.
+        """
+        source = self._numbered(_lines(source, self._line_reader))
+        if self._limits is not None:
+            source = self._within_limits(source)
+        counts = self._stack.counts
+        for line in source:
+            line = line.rstrip()
+            self._skip = (not counts[_HTML_CODE] and
+                          not counts[_HTML_PREFORMATTED] and
+                          '[[' not in line and '{{' not in line and
+                          '://' not in line)
+            self._offset = len(line) - len(line.lstrip())
+            self._parse_line(line)
+        self._close_tag()
+        return self._out.links
+
+    def _parse_link_markup(self, line, index):
+        end = line.find(']]', index)
+        if end < 0 or self._out._open:
+            return _ParseContext._parse_link_markup(self, line, index)
+        pipe = line.find('|', index, end)
+        if pipe < 0:
+            target = line[index:end]
+            self._out.add(target, target.strip())
+        elif _LINK_TOKENS[']]'].search(line, pipe + 1, end + 1) is None:
+            self._out.add(line[index:pipe].strip(),
+                          line[pipe + 1:end].strip())
+        else:
+            return _ParseContext._parse_link_markup(self, line, index)
+        self._tag = _HTML_LINK
+        return end + 2
+
+    def _parse_free_link(self, line, index):
+        if self._out._open:
+            return _ParseContext._parse_free_link(self, line, index)
+        length = len(line)
+        begin = index
+        while index < length and line[index] not in ' \t':
+            index += 1
+        if line[index - 1] in ',.?!:;"\'':
+            index -= 1
+        if self._link_limit_reached():
+            self._add_text(line, begin, index)
+            return index
+        href = line[begin:index]
+        self._out.add(href, href)
+        self._tag = _HTML_LINK
+        return index
+
+    def _add_text(self, text, begin, end):
+        # Only the text of link labels is recorded.
+        if self._out._open:
+            _ParseContext._add_text(self, text, begin, end)
+        elif begin < end and begin < len(text):
+            self._tag = None
+
+    def _numbered(self, lines):
+        """
+        Generate the lines while setting _line_number to the number of the
+        line being parsed.
+        """
+        number = 0
+        for line in lines:
+            number += 1
+            self._line_number = number
+            yield line
+
+    def _parse_fragment(self, line, index=0, delim=''):
+        length = len(line)
+        if self._skip:
+            return length
+        search = _LINK_TOKENS[delim].search
+        counts = self._stack.counts     # the same stack for the whole loop
+        out = self._out
+        begin = index
+        while index < length:
+            if counts[_HTML_CODE]:
+                index = self._parse_nowiki(line, index)
+                begin = index
+                continue
+            match = search(line, index)
+            if match is None:
+                index = length
+                break
+            index = match.start()
+            kind = match.lastgroup
+            if kind == 'tag':
+                tag = _INLINE_MARKUP_MAP[match.group()]
+                if self._stack.top() == tag:
+                    self._add_text(line, begin, index)
+                    self._close_tag(tag)
+                    begin = index + 2
+                elif not counts[tag]:
+                    self._add_text(line, begin, index)
+                    self._open_tag(tag)
+                    begin = index + 2
+                index += 2
+                continue
+            self._add_text(line, begin, index)
+            if kind == 'link':
+                out.markup = (kind, self._line_number, self._offset + index)
+                index = self._parse_link(line, index + 2)
+            elif kind == 'escape':
+                begin = index + 1
+                index += 2  # skip the escaped character
+                continue
+            elif kind == 'delim':
+                begin = index
+                break
+            elif kind == 'image':
+                out.markup = (kind, self._line_number, self._offset + index)
+                index = self._parse_image(line, index + 2)
+            elif kind == 'free_link':
+                out.markup = (kind, self._line_number, self._offset + index)
+                index = self._parse_free_link(line, index)
+            elif kind == 'break':
+                self._add_tag(_HTML_BREAK)
+                index += 2
+            else:
+                self._open_tag(_HTML_CODE)
+                index += 3
+            begin = index
+        self._add_text(line, begin, index)
+        return index
 
 
 def parse(source, resolver=None, html5=True):
@@ -740,7 +3201,8 @@ def parse(source, resolver=None, html5=True):
     and image URIs are passed to the resolver.  A URI beginning with the
     "<scheme>://" sequence is considered absolute.  The slash characters
     are required so that interwiki links are not considered absolute and
-    can be interpreted by the resolver.
+    can be interpreted by the resolver.  The resolver can also be an object
+    with a resolve_many() method as described for the CreoleParser class.
 
     If the html5 parameter is set to False, then self-closing tags such
     as <br>, <img>, and <hr> are output as <br/>, <img/>, and <hr/>.
@@ -753,13 +3215,378 @@ def parse(source, resolver=None, html5=True):
     return parser.parse(source)
 
 
-if __name__ == '__main__':
-    file = open('test/creole1.0test.txt')
-    result = parse(file)
-    file.close()
-    output_path = 'test/output.html'
-    file = open(output_path, 'wt')
+async def parse_async(source, resolver=None, html5=True, concurrency=16):
+    """
+    Parse Creole wiki markup from the specified source using asyncio.  This
+    is a module-level function that can be used instead of creating a
+    CreoleParser instance and calling its parse_async() method.
+
+    The source can also be an asynchronous iterator producing lines of text
+    and the resolver can be a coroutine function.  At most concurrency calls
+    to the resolver are in progress at the same time.
+    """
+    parser = CreoleParser(resolver, html5)
+    return await parser.parse_async(source, concurrency)
+
+
+def parse_file(path, stream, resolver=None, html5=True, encoding='utf-8'):
+    """
+    Parse Creole wiki markup from the file at the specified path and write
+    the HTML text to the stream.  This is a module-level function that can
+    be used instead of creating a CreoleParser instance and calling its
+    parse_file() method.
+
+    Returns the first heading in the text (or None if there is none).
+    """
+    parser = CreoleParser(resolver, html5)
+    return parser.parse_file(path, stream, encoding)
+
+
+def parse_tree(source, resolver=None):
+    """
+    Parse Creole wiki markup from the specified source into a Document.
+    This is a module-level function that can be used instead of creating
+    a CreoleParser instance and calling its parse_tree() method.
+    """
+    parser = CreoleParser(resolver)
+    return parser.parse_tree(source)
+
+
+def parse_text(source, resolver=None, max_chars=None, max_blocks=None):
+    """
+    Parse Creole wiki markup from the specified source into plain text.
+    This is a module-level function that can be used instead of creating a
+    CreoleParser instance and calling its parse_text() method.
+
+    The max_chars and max_blocks parameters limit the text to that many
+    characters and blocks.  The parse stops as soon as a limit is reached.
+    """
+    parser = CreoleParser(resolver)
+    return parser.parse_text(source, max_chars, max_blocks)
+
+
+def extract_links(source):
+    """
+    Return the links and images of the Creole wiki markup from the specified
+    source as a list of Link tuples.  This is a module-level function that
+    can be used instead of creating a CreoleParser instance and calling its
+    extract_links() method.
+    """
+    parser = CreoleParser()
+    return parser.extract_links(source)
+
+
+def render_html(document, html5=True):
+    """
+    Render a Document as HTML5 text (or as XHTML if html5 is False).
+
+    The document can also be the bytes of a document returned by dumps().
+    The HTML text is then rendered directly from the bytes.
+
+    Returns a ParseResult instance identical to the one returned by parsing
+    the source of the document with the parse() function.
+    """
+    writer = _HTMLWriter(html5)
+    if isinstance(document, Element):
+        _replay(document, writer)
+        heading = document.heading
+    else:
+        heading = _replay_binary(document, writer)
+    return ParseResult(writer.flush(), heading, writer.outline)
+
+
+def render_text(document):
+    """
+    Render a Document (or the bytes returned by dumps()) as plain text
+    without any markup.
+
+    Each block (paragraph, heading, list item, table row, and so on) is
+    written on a line of its own.
+    """
+    writer = _TextWriter()
+    if isinstance(document, Element):
+        _replay(document, writer)
+    else:
+        _replay_binary(document, writer)
+    return writer.flush()
+
+
+def dumps(document):
+    """
+    Return the Document as bytes in a compact binary format.
+
+    The format has a table of the distinct strings of the document (text
+    and attribute values are stored only once) followed by the tags and
+    text as small integers.  It does not depend on html5 or XHTML output.
+    The bytes can be rendered with render_html() and render_text() without
+    first creating a Document or converted back to one with loads().
+    Attribute values are stored as strings.
+    """
+    writer = _BinaryWriter()
+    _replay(document, writer)
+    return writer.getvalue(document.heading)
+
+
+def loads(data):
+    """
+    Return the Document stored in the bytes returned by dumps().  Raises
+    ValueError if the data is not a complete binary document.
+    """
+    builder = _TreeBuilder()
+    heading = _replay_binary(data, builder)
+    return builder.document(heading)
+
+
+def iter_parse(source, resolver=None, html5=True):
+    """
+    Parse Creole wiki markup from the specified source in chunks.  This is
+    a module-level function that can be used instead of creating a
+    CreoleParser instance and calling its iter_parse() method.
+
+    Returns a ParseStream instance.  This is an iterator producing the HTML
+    text in chunks.  Its heading attribute has the value of the first heading
+    in the text once the iterator is exhausted.
+    """
+    parser = CreoleParser(resolver, html5)
+    return parser.iter_parse(source)
+
+
+def parse_many(sources, resolver=None, html5=True, workers=None, chunksize=1):
+    """
+    Parse many documents using a pool of worker processes.  This is a
+    module-level function that can be used instead of creating a
+    CreoleParser instance and calling its parse_many() method.
+
+    Returns an iterator producing a ParseResult instance for each of the
+    sources in the same order as the sources.
+    """
+    parser = CreoleParser(resolver, html5)
+    return parser.parse_many(sources, workers, chunksize)
+
+
+def parse_parallel(source, resolver=None, html5=True, workers=None):
+    """
+    Parse one large document using a pool of worker processes.  This is a
+    module-level function that can be used instead of creating a
+    CreoleParser instance and calling its parse_parallel() method.
+
+    Returns a ParseResult instance identical to the one returned by parse().
+    """
+    parser = CreoleParser(resolver, html5)
+    return parser.parse_parallel(source, workers)
+
+
+def _convert_files(parser, tasks):
+    """
+    Convert the files of a list of (source path, output path, digest) tasks
+    to HTML and return a list of (digest, size, error) tuples.
+
+    The digest of a task is the SHA-256 digest of the source when its output
+    was last written (or None).  A source with the same digest is not parsed
+    again if its output exists and the size of the result is then None.  The
+    error is a message if the file could not be converted and None if not.
+    """
+    results = []
+    for source_path, output_path, previous in tasks:
+        try:
+            with open(source_path, 'rb') as file:
+                data = file.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if digest == previous and os.path.exists(output_path):
+                results.append((digest, None, None))
+                continue
+            result = parser.parse(data)
+            directory = os.path.dirname(output_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(output_path, 'w', encoding='utf-8') as file:
+                print(result, file=file)
+            results.append((digest, len(data), None))
+        except (OSError, ValueError) as e:
+            results.append((None, None, '{0}: {1}'.format(source_path, e)))
+    return results
+
+
+def _convert_chunks(parser, chunks, workers):
+    """
+    Generate the results of _convert_files() for each chunk of tasks in
+    order as they come back from a pool of worker processes (or from this
+    process if there is only one worker or one chunk).
+    """
+    if workers > 1 and len(chunks) > 1:
+        with futures.ProcessPoolExecutor(workers) as executor:
+            for results in executor.map(_convert_files,
+                                         itertools.repeat(parser), chunks):
+                yield results
+    else:
+        for chunk in chunks:
+            yield _convert_files(parser, chunk)
+
+
+def _write_manifest(path, config, files):
+    """
+    Replace the manifest at the path with one for the configuration and the
+    entries of the files.  It is written to a temporary file first so that
+    the manifest is never left partly written.
+    """
+    import json
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump({'config': config, 'files': files}, file, indent=0,
+                  sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def _convert(parser, source, output, pattern, suffix, workers, manifest_path,
+             force):
+    """
+    Convert the files matching the glob pattern in the source directory tree
+    to HTML files with the suffix at the same relative paths in the output
+    directory and print a summary.  Returns the number of files that could
+    not be converted.
+
+    The manifest is a JSON file recording the modification time, size, and
+    SHA-256 digest of each source when it was converted.  A source whose
+    time and size have not changed is skipped without being read and one
+    whose digest has not changed is skipped without being parsed, unless
+    force is True or the output format has changed.  The manifest is
+    written at the end and every _MANIFEST_INTERVAL seconds while results
+    come back so that an interrupted conversion keeps most of the files
+    converted so far.
+
+    The files are converted in chunks of at most _MAX_CONVERT_CHUNK files,
+    small enough for each worker to get about four chunks.
+    """
+    import glob
+    import json
+    start = time.perf_counter()
+    config = {'html5': parser._html5, 'suffix': suffix}
+    try:
+        with open(manifest_path, encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+    entries = manifest.get('files', {})
+    if force or manifest.get('config') != config:
+        entries = {}
+    files = {}
+    tasks = []
+    pending = []    # the key and the time and size of the source of each task
+    unchanged = 0
+    for path in sorted(glob.glob(os.path.join(source, pattern),
+                                 recursive=True)):
+        if not os.path.isfile(path):
+            continue
+        key = os.path.relpath(path, source)
+        output_path = os.path.join(output, os.path.splitext(key)[0] + suffix)
+        stat = os.stat(path)
+        entry = entries.get(key)
+        if (entry is not None and entry[:2] == [stat.st_mtime_ns,
+                                                stat.st_size] and
+                os.path.exists(output_path)):
+            files[key] = entry
+            unchanged += 1
+            continue
+        tasks.append((path, output_path, entry and entry[2]))
+        pending.append((key, [stat.st_mtime_ns, stat.st_size]))
+    count = 4 * workers
+    chunksize = min(max((len(tasks) + count - 1) // count, 1),
+                    _MAX_CONVERT_CHUNK)
+    chunks = [tasks[i:i + chunksize]
+              for i in range(0, len(tasks), chunksize)]
+    keys = [pending[i:i + chunksize]
+            for i in range(0, len(pending), chunksize)]
+    converted = failed = size = 0
+    written = time.perf_counter()
+    for chunk_keys, results in zip(keys,
+                                   _convert_chunks(parser, chunks, workers)):
+        for (key, stat), (digest, length, error) in zip(chunk_keys, results):
+            if error is not None:
+                print(error, file=sys.stderr)
+                failed += 1
+                continue
+            files[key] = stat + [digest]
+            if length is None:
+                unchanged += 1
+            else:
+                converted += 1
+                size += length
+        if time.perf_counter() - written >= _MANIFEST_INTERVAL:
+            _write_manifest(manifest_path, config, files)
+            written = time.perf_counter()
+    _write_manifest(manifest_path, config, files)
+    seconds = time.perf_counter() - start
+    print('{0} converted, {1} unchanged, {2} failed in {3:.2f} s '
+          '({4:.1f} files/s, {5:.2f} MB/s)'.format(
+              converted, unchanged, failed, seconds, converted / seconds,
+              size / seconds / 1e6))
+    return failed
+
+
+def main(argv=None):
+    """
+    Convert Creole wiki markup files to HTML from the command line and
+    return the exit status (see "python -m creole_parser --help").
+    """
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python -m creole_parser',
+        description='Convert Creole wiki markup to HTML.  Without arguments, '
+                    'test/creole1.0test.txt is converted to test/output.html.')
+    parser.add_argument('source', nargs='?',
+                        help='a markup file or a directory of markup files')
+    parser.add_argument('output', nargs='?',
+                        help='the HTML file (the default is standard output) '
+                             'or the directory of the HTML files')
+    parser.add_argument('--glob', default='**/*.txt', metavar='PATTERN',
+                        help='the files converted in a source directory '
+                             '(default **/*.txt)')
+    parser.add_argument('--suffix', default='.html',
+                        help='the suffix replacing that of each source file '
+                             '(default .html)')
+    parser.add_argument('--xhtml', action='store_true',
+                        help='output XHTML instead of HTML5')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='the number of worker processes (default is the '
+                             'number of processors)')
+    parser.add_argument('--manifest', metavar='FILE',
+                        help='the manifest of a converted directory (default '
+                             'OUTPUT/{0})'.format(_MANIFEST_NAME))
+    parser.add_argument('--force', action='store_true',
+                        help='convert all files even if they have not changed')
+    args = parser.parse_args(argv)
+    creole_parser = CreoleParser(html5=not args.xhtml)
+    if args.source is None:
+        args.source = 'test/creole1.0test.txt'
+        args.output = 'test/output.html'
+    if os.path.isdir(args.source):
+        if args.output is None:
+            parser.error('an output directory is required')
+        manifest = args.manifest or os.path.join(args.output, _MANIFEST_NAME)
+        failed = _convert(creole_parser, args.source, args.output, args.glob,
+                          args.suffix, args.workers, manifest, args.force)
+        return 1 if failed else 0
+    try:
+        with open(args.source, 'rb') as file:
+            result = creole_parser.parse(file.read())
+    except (OSError, ValueError) as e:
+        print('{0}: {1}'.format(args.source, e), file=sys.stderr)
+        return 1
+    if args.output is None or args.output == '-':
+        print(result)
+        return 0
+    try:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            print(result, file=file)
+    except OSError as e:
+        print('{0}: {1}'.format(args.output, e), file=sys.stderr)
+        return 1
     print('Heading:', result.heading)
-    print('HTML is in', output_path)
-    print(result, file=file)
-    file.close()
+    print('HTML is in', args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())